@@ -0,0 +1,99 @@
+"""大本子PDF转换的内存峰值与耗时
+
+    python bench/pdf_stream.py [--pages 1000] [--width 1000] [--height 1400]
+
+生成一个合成的本子（JPEG为主，每10页夹一张PNG），分别在独立子进程中：
+- img2pdf: 旧的转换方式，整本PDF在内存中拼好后一次写出（需安装img2pdf）
+- stream: StreamingPDFWriter逐页写入
+记录子进程的峰值RSS（ru_maxrss）与耗时；需要安装Pillow
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PLUGIN_DIR)
+
+
+def make_album(directory: str, pages: int, width: int, height: int):
+    """生成合成页面：浅色底加一块随机噪点，模拟漫画页的线稿与网点"""
+    from PIL import Image
+
+    noise_h = height // 4
+    for i in range(1, pages + 1):
+        img = Image.new("RGB", (width, height), (250, 248, 245))
+        noise = Image.frombytes("RGB", (width, noise_h), os.urandom(width * noise_h * 3))
+        img.paste(noise, (0, (i * 37) % (height - noise_h)))
+        if i % 10 == 0:
+            img.save(os.path.join(directory, f"{i:05d}.png"))
+        else:
+            img.save(os.path.join(directory, f"{i:05d}.jpg"), quality=85)
+
+
+def run_child(mode: str, directory: str, output: str):
+    """子进程中执行一次转换并输出结果"""
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory))
+    start = time.perf_counter()
+    if mode == "img2pdf":
+        import img2pdf
+
+        with open(output, "wb") as f:
+            f.write(img2pdf.convert(files, rotation=img2pdf.Rotation.ifvalid))
+    else:
+        from pdf_writer import StreamingPDFWriter
+
+        with StreamingPDFWriter(output) as writer:
+            for file in files:
+                writer.add_image(file)
+    cost = time.perf_counter() - start
+    # Linux下ru_maxrss单位为KB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": cost, "peak_kb": peak, "size": os.path.getsize(output)}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=1000)
+    parser.add_argument("--height", type=int, default=1400)
+    parser.add_argument("--child", choices=("img2pdf", "stream"))
+    parser.add_argument("--dir")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.dir, args.output)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        album = os.path.join(tmp, "album")
+        os.mkdir(album)
+        make_album(album, args.pages, args.width, args.height)
+        total = sum(os.path.getsize(os.path.join(album, f)) for f in os.listdir(album))
+        print(f"{args.pages} 页，图片共 {total / 1024 / 1024:.1f}MB")
+
+        for mode in ("img2pdf", "stream"):
+            output = os.path.join(tmp, f"{mode}.pdf")
+            proc = subprocess.run(
+                [sys.executable, __file__, "--child", mode, "--dir", album, "--output", output],
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{mode:<8} 失败: {proc.stderr.strip().splitlines()[-1]}")
+                continue
+            result = json.loads(proc.stdout)
+            print(
+                f"{mode:<8} 峰值RSS {result['peak_kb'] / 1024:8.1f}MB  "
+                f"耗时 {result['seconds']:6.2f}s  PDF {result['size'] / 1024 / 1024:.1f}MB"
+            )
+            os.remove(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""PDF缓存模块
+
+按磁盘配额缓存生成的PDF，热门漫画可直接发送，不再重复下载
+"""
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from astrbot.api import logger
+
+INDEX_FILE = "index.json"
+
+
+class PDFCache:
+    """PDF缓存
+
+    缓存目录位于下载目录下的 pdf_cache，目录中的 index.json 记录每个PDF的
+    大小、创建时间与最近访问时间，启动时只读取索引而不扫描目录；
+    总大小超出配额时按最近访问时间淘汰（LRU），超过有效期的PDF视为未命中；
+    正在发送中的PDF会被锁定，不会被淘汰
+    """
+
+    def __init__(self, config_manager):
+        """初始化PDF缓存
+
+        Args:
+            config_manager: 配置管理器实例
+        """
+        self.config_manager = config_manager
+        self.cache_dir: Optional[str] = None
+        # 漫画ID -> {"file", "size", "created", "accessed"}
+        self._entries: Dict[str, dict] = {}
+        # 漫画ID -> 锁定次数
+        self._pins: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """配额大于0时启用缓存（动态读取配置）"""
+        return self._max_bytes() > 0
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry["size"] for entry in self._entries.values())
+
+    def _max_bytes(self) -> int:
+        max_gb = self.config_manager.get_config_value('pdf_cache_gb', 0)
+        return int(max_gb * 1024 ** 3) if max_gb and max_gb > 0 else 0
+
+    def _ttl_seconds(self) -> float:
+        ttl_hours = self.config_manager.get_config_value('pdf_cache_ttl_hours', 0)
+        return ttl_hours * 3600 if ttl_hours and ttl_hours > 0 else 0
+
+    def load(self, download_dir: str):
+        """读取缓存索引
+
+        Args:
+            download_dir: 下载目录，缓存目录位于其下
+        """
+        cache_dir = os.path.join(download_dir, "pdf_cache")
+        if cache_dir == self.cache_dir:
+            return
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self._entries = {}
+
+        index_path = os.path.join(cache_dir, INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f).get("entries", {})
+            except Exception as e:
+                logger.warning(f"读取PDF缓存索引失败，将重新建立: {str(e)}")
+        logger.info(f"PDF缓存: {len(self._entries)} 个文件，共 {self.total_size / 1024 ** 2:.1f} MB")
+
+    def get(self, comic_id: str) -> Optional[str]:
+        """查询缓存并更新访问时间
+
+        Args:
+            comic_id: 漫画ID
+
+        Returns:
+            缓存的PDF路径，未命中返回None
+        """
+        entry = self._entries.get(comic_id)
+        if entry is None:
+            return None
+        path = os.path.join(self.cache_dir, entry["file"])
+        ttl = self._ttl_seconds()
+        expired = ttl and time.time() - entry["created"] > ttl
+        if expired or not os.path.exists(path):
+            self.config_manager.log('info', f"PDF缓存已失效: {comic_id}")
+            if comic_id not in self._pins:
+                self._remove(comic_id)
+                self._save()
+            return None
+
+        entry["accessed"] = time.time()
+        self._save()
+        return path
+
+    def put(self, comic_id: str, pdf_path: str) -> Optional[str]:
+        """把生成的PDF移入缓存，并按配额淘汰
+
+        Args:
+            comic_id: 漫画ID
+            pdf_path: 生成的PDF路径
+
+        Returns:
+            缓存中的PDF路径；超出配额无法缓存时返回None，原文件保持不动
+        """
+        max_bytes = self._max_bytes()
+        size = os.path.getsize(pdf_path)
+        if size > max_bytes:
+            logger.warning(f"PDF大小 {size / 1024 ** 2:.1f} MB 超出缓存配额，不缓存")
+            return None
+
+        file_name = f"jm_{comic_id}.pdf"
+        cached_path = os.path.join(self.cache_dir, file_name)
+        os.replace(pdf_path, cached_path)
+        now = time.time()
+        self._entries[comic_id] = {"file": file_name, "size": size, "created": now, "accessed": now}
+        # 新放入的PDF不参与本次淘汰：其余PDF都被锁定时宁可暂时超出配额，等解除锁定后再淘汰
+        self._evict(max_bytes, keep=comic_id)
+        self._save()
+        return cached_path
+
+    def pin(self, comic_id: str):
+        """锁定PDF，发送期间不会被淘汰"""
+        self._pins[comic_id] = self._pins.get(comic_id, 0) + 1
+
+    def unpin(self, comic_id: str):
+        """解除锁定，并补做锁定期间被推迟的淘汰"""
+        count = self._pins.get(comic_id, 0) - 1
+        if count > 0:
+            self._pins[comic_id] = count
+            return
+        self._pins.pop(comic_id, None)
+        if self._evict(self._max_bytes()):
+            self._save()
+
+    def _evict(self, max_bytes: int, keep: Optional[str] = None) -> bool:
+        """淘汰过期PDF，再按最近访问时间淘汰直到总大小不超过配额
+
+        Args:
+            max_bytes: 配额
+            keep: 不参与淘汰的漫画ID（刚放入的PDF）
+
+        Returns:
+            是否有PDF被淘汰
+        """
+        candidates = [c for c in self._entries if c not in self._pins and c != keep]
+        ttl = self._ttl_seconds()
+        evicted = False
+        if ttl:
+            now = time.time()
+            for comic_id in candidates:
+                if now - self._entries[comic_id]["created"] > ttl:
+                    self._remove(comic_id)
+                    evicted = True
+
+        total = self.total_size
+        if total <= max_bytes:
+            return evicted
+        candidates = sorted(
+            (c for c in self._entries if c not in self._pins and c != keep),
+            key=lambda c: self._entries[c]["accessed"],
+        )
+        for comic_id in candidates:
+            if total <= max_bytes:
+                break
+            total -= self._entries[comic_id]["size"]
+            self._remove(comic_id)
+            evicted = True
+        return evicted
+
+    def _remove(self, comic_id: str):
+        entry = self._entries.pop(comic_id)
+        try:
+            os.remove(os.path.join(self.cache_dir, entry["file"]))
+            self.config_manager.log('info', f"已淘汰缓存PDF: {entry['file']}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"删除缓存PDF失败: {str(e)}")
+
+    def _save(self):
+        """原子写入索引"""
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, index_path)
+        except Exception as e:
+            logger.warning(f"写入PDF缓存索引失败: {str(e)}")
@@ -5,14 +5,28 @@
 import os
 import re
 import asyncio
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 from astrbot.api import logger
 
-try:
-    import img2pdf
-except ImportError:
-    img2pdf = None
+from .pdf_writer import StreamingPDFWriter
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff')
+
+
+def add_images(writer: StreamingPDFWriter, image_files: List[str]):
+    """依次写入图片，无法识别的图片跳过
+    
+    Args:
+        writer: PDF写入器
+        image_files: 图片路径列表
+    """
+    for image_file in image_files:
+        try:
+            writer.add_image(image_file)
+        except Exception as e:
+            logger.warning(f"跳过无法识别的图片 {image_file}: {str(e)}")
 
 
 class PDFConverter:
@@ -37,52 +51,75 @@ class PDFConverter:
         Returns:
             PDF文件路径，如果失败返回None
         """
-        # 收集所有图片文件
-        image_files = []
-        image_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff')
-        
         self.config_manager.log('info', f"开始收集图片文件，源目录: {source_dir}")
-        
-        # 递归搜索所有图片文件
-        for root, dirs, files in os.walk(source_dir):
-            for file in files:
-                if file.lower().endswith(image_extensions):
-                    image_files.append(os.path.join(root, file))
+        image_files = self.collect_images(source_dir)
         
         if not image_files:
             logger.error(f"在 {source_dir} 中未找到图片文件")
             return None
         
-        # 自然排序（确保页面顺序正确）
-        image_files = self._natural_sort(image_files)
         self.config_manager.log('info', f"找到 {len(image_files)} 个图片文件")
         
         # 转换为PDF
         pdf_path = os.path.join(download_dir, f"jm_{comic_id}.pdf")
         
         try:
-            # 直接使用img2pdf进行无损转换
-            # img2pdf会自动处理JPEG、PNG等格式，无需手动转换
-            # 对于RGBA等特殊格式，img2pdf会自动应用PNG Paeth过滤器
+            # 逐页写入PDF：JPEG原样写入，其余格式无损压缩
+            # 内存占用只与单页图片有关，与总页数无关
             self.config_manager.log('info', f"开始转换PDF，共 {len(image_files)} 张图片")
             
+            # 先写入临时文件，完成后再替换，避免留下不完整的PDF
+            part_path = pdf_path + ".part"
+            
             # 定义转换函数（在线程中运行）
-            def convert_to_pdf_sync():
-                with open(pdf_path, "wb") as f:
-                    # 使用 rotation=img2pdf.Rotation.ifvalid 处理无效的EXIF方向值
-                    f.write(img2pdf.convert(image_files, rotation=img2pdf.Rotation.ifvalid))
+            def convert_to_pdf_sync() -> int:
+                with StreamingPDFWriter(part_path) as writer:
+                    add_images(writer, image_files)
+                    if writer.page_count == 0:
+                        raise ValueError("没有可写入PDF的图片")
+                os.replace(part_path, pdf_path)
+                return writer.page_count
             
             # 使用 asyncio.to_thread 在后台线程运行 PDF 转换
             # 避免大量图片时阻塞事件循环
-            await asyncio.to_thread(convert_to_pdf_sync)
+            pages = await asyncio.to_thread(convert_to_pdf_sync)
             
-            logger.info(f"PDF转换成功: {pdf_path}")  # 关键日志，强制输出
+            logger.info(f"PDF转换成功: {pdf_path}，共 {pages} 页")  # 关键日志，强制输出
             return pdf_path
             
         except Exception as e:
             logger.error(f"PDF转换失败: {str(e)}", exc_info=True)
             return None
 
+    def collect_images(self, source_dir: str) -> List[str]:
+        """递归收集目录下的图片文件
+        
+        Args:
+            source_dir: 图片所在目录
+            
+        Returns:
+            自然排序后的图片路径列表（确保页面顺序正确）
+        """
+        image_files = []
+        for root, dirs, files in os.walk(source_dir):
+            for file in files:
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    image_files.append(os.path.join(root, file))
+        return self._natural_sort(image_files)
+    
+    def open_builder(self, comic_id: str, download_dir: str) -> "IncrementalPDFBuilder":
+        """创建按章节增量写入的PDF构建器，供下载过程中边下边转
+        
+        Args:
+            comic_id: 漫画ID
+            download_dir: PDF输出目录
+            
+        Returns:
+            增量PDF构建器
+        """
+        pdf_path = os.path.join(download_dir, f"jm_{comic_id}.pdf")
+        return IncrementalPDFBuilder(self, pdf_path)
+    
     def _natural_sort(self, file_list: list) -> list:
         """自然排序文件列表（按数字大小排序而非字符串）
         
@@ -98,3 +135,149 @@ class PDFConverter:
                     for c in re.split(r'(\d+)', text)]
         
         return sorted(file_list, key=natural_key)
+
+
+class IncrementalPDFBuilder:
+    """增量PDF构建器
+    
+    下载器每完成一个章节就通知构建器，构建器在独立的写入线程中
+    按章节顺序把已完成的章节写入PDF；后面的章节先下完时暂存，
+    等前面的章节完成后再依次写入。下载结束时PDF只差收尾，
+    不需要再从头转换整本
+    """
+    
+    def __init__(self, converter: PDFConverter, pdf_path: str):
+        """初始化构建器
+        
+        Args:
+            converter: PDF转换器实例
+            pdf_path: 输出PDF路径
+        """
+        self.converter = converter
+        self.pdf_path = pdf_path
+        self._part_path = pdf_path + ".part"
+        # 单线程执行器：所有写入都在同一线程中按提交顺序进行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jm2pdf")
+        self._writer: Optional[StreamingPDFWriter] = None
+        # 章节序号 -> 图片目录
+        self._dirs: Dict[int, str] = {}
+        # 已下载完成、等待写入的章节：序号 -> 图片列表
+        self._done: Dict[int, List[str]] = {}
+        self._next_index = 1
+        self._closed = False
+        self.broken = False
+    
+    def photo_started(self, index: int, save_dir: str):
+        """章节开始下载（在jmcomic的下载线程中调用）"""
+        self._submit(self._on_started, index, save_dir)
+    
+    def photo_done(self, index: int, save_dir: str, image_files: Optional[List[str]] = None):
+        """章节下载完成（在jmcomic的下载线程中调用）
+        
+        Args:
+            index: 章节序号
+            save_dir: 章节图片目录
+            image_files: 本章节的图片路径，未提供时收集目录中的图片
+        """
+        self._submit(self._on_done, index, save_dir, image_files)
+    
+    def failed(self, error: Exception):
+        """下载钩子出错，放弃增量构建，由调用方回退为整本转换"""
+        logger.warning(f"增量生成PDF失败，将在下载完成后整本转换: {str(error)}")
+        self.broken = True
+    
+    async def finish(self) -> Optional[str]:
+        """写入剩余章节并完成PDF
+        
+        下载超时时，未完成的章节按目录中已有的图片写入
+        
+        Returns:
+            PDF文件路径，没有写入任何页面或构建失败时返回None
+        """
+        self._closed = True
+        try:
+            return await asyncio.wrap_future(self._executor.submit(self._finish))
+        finally:
+            self._executor.shutdown(wait=False)
+    
+    def abort(self):
+        """放弃构建并删除未完成的文件"""
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.submit(self._abort)
+        self._executor.shutdown(wait=False)
+    
+    def _submit(self, func, *args):
+        if self._closed or self.broken:
+            return
+        try:
+            self._executor.submit(func, *args)
+        except RuntimeError:
+            # 下载超时后jmcomic线程仍可能继续回调，此时执行器已关闭
+            pass
+    
+    def _on_started(self, index: int, save_dir: str):
+        self._check_dir(index, save_dir)
+        self._dirs[index] = save_dir
+    
+    def _on_done(self, index: int, save_dir: str, image_files: Optional[List[str]]):
+        self._check_dir(index, save_dir)
+        self._dirs[index] = save_dir
+        if image_files is None:
+            image_files = self.converter.collect_images(save_dir)
+        self._done[index] = image_files
+        self.converter.config_manager.log('info', f"章节 {index} 下载完成，共 {len(self._done[index])} 张图片")
+        try:
+            # 写入从下一章开始连续完成的章节
+            while self._next_index in self._done:
+                self._write(self._next_index, self._done.pop(self._next_index))
+                self._next_index += 1
+        except Exception as e:
+            self.failed(e)
+    
+    def _check_dir(self, index: int, save_dir: str):
+        """多个章节保存在同一目录时（如目录规则不含Pindex），
+        无法区分未完成章节的图片，也可能因同名文件互相覆盖，放弃增量构建改为整本转换"""
+        if self.broken:
+            return
+        for other, other_dir in self._dirs.items():
+            if other != index and other_dir == save_dir:
+                self.failed(ValueError(f"章节 {other} 与 {index} 保存在同一目录 {save_dir}"))
+                return
+    
+    def _write(self, index: int, image_files: List[str]):
+        if self.broken:
+            return
+        if self._writer is None:
+            self._writer = StreamingPDFWriter(self._part_path)
+        add_images(self._writer, image_files)
+        self.converter.config_manager.log('info', f"章节 {index} 已写入PDF，当前共 {self._writer.page_count} 页")
+    
+    def _finish(self) -> Optional[str]:
+        try:
+            # 剩余章节（有章节缺失或下载超时）按序号写入，未完成的章节使用目录中已有的图片
+            for index in sorted(self._dirs):
+                if index < self._next_index:
+                    continue
+                image_files = self._done.pop(index, None)
+                if image_files is None:
+                    image_files = self.converter.collect_images(self._dirs[index])
+                self._write(index, image_files)
+            
+            if self.broken or self._writer is None or self._writer.page_count == 0:
+                self._abort()
+                return None
+            pages = self._writer.close()
+            os.replace(self._part_path, self.pdf_path)
+            logger.info(f"PDF转换成功: {self.pdf_path}，共 {pages} 页")  # 关键日志，强制输出
+            return self.pdf_path
+        except Exception as e:
+            logger.error(f"增量生成PDF失败: {str(e)}", exc_info=True)
+            self._abort()
+            return None
+    
+    def _abort(self):
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
@@ -3,6 +3,7 @@
 负责从禁漫天堂下载漫画
 """
 import asyncio
+import threading
 
 try:
     import jmcomic
@@ -10,6 +11,62 @@ except ImportError:
     jmcomic = None
 
 
+def _hooked_downloader(listener, cancelled: threading.Event):
+    """创建在章节开始和完成时通知listener、并可中途停止的下载器类
+    
+    Args:
+        listener: 提供 photo_started / photo_done / failed 方法的对象（可为None），
+            回调在jmcomic的下载线程中执行；photo_done 额外收到本章节图片的路径列表
+        cancelled: 设置后不再开始新的章节和图片，正在下载的图片完成后线程即退出
+            
+    Returns:
+        JmDownloader的子类，供 jmcomic.download_album 的 downloader 参数使用
+    """
+    class HookedDownloader(jmcomic.JmDownloader):
+        def __init__(self, option):
+            super().__init__(option)
+            # 章节 -> [(图片序号, 保存路径)]，图片在多个线程中并发下载
+            self._photo_images = {}
+            self._images_lock = threading.Lock()
+        
+        def download_by_photo_detail(self, photo):
+            if not cancelled.is_set():
+                super().download_by_photo_detail(photo)
+        
+        def download_by_image_detail(self, image):
+            if not cancelled.is_set():
+                super().download_by_image_detail(image)
+        
+        def before_photo(self, photo):
+            super().before_photo(photo)
+            self._notify("photo_started", photo)
+        
+        def after_image(self, image, img_save_path):
+            super().after_image(image, img_save_path)
+            with self._images_lock:
+                self._photo_images.setdefault(image.from_photo, []).append((image.index, img_save_path))
+        
+        def after_photo(self, photo):
+            super().after_photo(photo)
+            with self._images_lock:
+                images = self._photo_images.pop(photo, [])
+            # 已取消时章节并不完整，不再通知
+            if not cancelled.is_set():
+                # 只交出本章节的图片，多个章节共用一个目录时也不会混入其他章节
+                self._notify("photo_done", photo, [path for _, path in sorted(images)])
+        
+        def _notify(self, name, photo, *args):
+            if listener is None:
+                return
+            # 钩子出错不能影响下载本身
+            try:
+                getattr(listener, name)(photo.album_index, self.option.decide_image_save_dir(photo), *args)
+            except Exception as e:
+                listener.failed(e)
+    
+    return HookedDownloader
+
+
 class ComicDownloader:
     """漫画下载器"""
     
@@ -21,12 +78,13 @@ class ComicDownloader:
         """
         self.config_manager = config_manager
     
-    async def download_comic(self, comic_id: str, download_path: str):
+    async def download_comic(self, comic_id: str, download_path: str, listener=None):
         """下载漫画到指定目录
         
         Args:
             comic_id: 漫画ID
             download_path: 下载目录
+            listener: 可选，章节开始和下载完成时收到通知（如增量PDF构建器）
         """
         # 动态读取配置
         proxy = self.config_manager.get_config_value('proxy', '')
@@ -115,5 +173,21 @@ class ComicDownloader:
         
         # 使用 asyncio.to_thread 在后台线程运行阻塞的下载函数
         # 这样不会阻塞 AstrBot 的事件循环
-        await asyncio.to_thread(jmcomic.download_album, comic_id, option)
+        cancelled = threading.Event()
+        downloader = _hooked_downloader(listener, cancelled)
+        thread = asyncio.ensure_future(
+            asyncio.to_thread(jmcomic.download_album, comic_id, option, downloader=downloader)
+        )
+        try:
+            await asyncio.shield(thread)
+        except asyncio.CancelledError:
+            # 任务被取消或超时：线程无法强行终止，通知其停止并等它真正退出后再返回，
+            # 调用方之后才会删除临时目录、释放并发名额
+            cancelled.set()
+            self.config_manager.log('info', f"正在停止漫画 {comic_id} 的下载线程")
+            try:
+                await thread
+            except Exception:
+                pass
+            raise
         # 下载完成由调用方记录关键日志
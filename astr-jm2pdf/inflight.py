@@ -0,0 +1,194 @@
+"""进行中任务登记模块
+
+同一漫画同一时间只执行一个下载转换任务，
+之后的请求加入正在执行的任务，收到相同的进度消息和PDF文件
+"""
+import asyncio
+import itertools
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from astrbot.api import logger
+
+
+class JobMessage(NamedTuple):
+    """任务产生的一条消息
+
+    Attributes:
+        kind: 消息类型，"plain" 为文本，"file" 为文件
+        content: 文本内容或文件路径
+        name: 文件名（仅文件消息）
+        replay: 是否补发给中途加入的请求（结果类消息），进度消息不补发
+    """
+    kind: str
+    content: str
+    name: str = ""
+    replay: bool = False
+
+
+class InflightJob:
+    """进行中的任务
+
+    任务在独立的协程中执行，产生的消息保存在列表中，
+    每个请求通过 follow 按顺序读取；所有请求都读完、任务也结束后，
+    依次执行登记的清理函数（如删除PDF）
+    """
+
+    def __init__(self, key: str, registry: "InflightRegistry"):
+        """初始化任务
+
+        Args:
+            key: 任务键（漫画ID）
+            registry: 所属的登记表
+        """
+        self.key = key
+        self.registry = registry
+        self.messages: List[JobMessage] = []
+        self.finished = False
+        self.refs = 0
+        self.task: Optional[asyncio.Task] = None
+        # 每次 follow 的编号 -> 请求者ID；退出按编号记录，同一请求者重新请求时不受影响
+        self._followers: Dict[int, str] = {}
+        self._detached: Set[int] = set()
+        self._follow_ids = itertools.count()
+        self._cancel_message = "❌ 任务已取消"
+        self._updated = asyncio.Event()
+        self._cleanups: List[Callable[[], None]] = []
+
+    def start(self, coro):
+        """在独立协程中执行任务，请求方断开也不影响其他订阅者"""
+        self.task = asyncio.create_task(self._run(coro))
+
+    async def _run(self, coro):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            self.publish("plain", self._cancel_message, replay=True)
+            raise
+        except Exception as e:
+            logger.error(f"任务 {self.key} 执行出错: {str(e)}", exc_info=True)
+            self.publish("plain", f"❌ 处理失败: {str(e)}", replay=True)
+        finally:
+            self._close()
+
+    def cancel(self, message: str = "❌ 任务已取消"):
+        """取消任务，并把取消原因发送给所有请求"""
+        if self.task is not None and not self.task.done():
+            self._cancel_message = message
+            self.task.cancel()
+
+    def detach(self, subscriber: str):
+        """某个请求者的当前请求退出，任务继续为其他请求者执行"""
+        self._detached.update(
+            follow_id for follow_id, follower in self._followers.items()
+            if follower == subscriber
+        )
+        self._wake()
+
+    def is_following(self, subscriber: str) -> bool:
+        """请求者是否正通过自己的请求接收消息"""
+        return any(
+            follower == subscriber and follow_id not in self._detached
+            for follow_id, follower in self._followers.items()
+        )
+
+    def publish(self, kind: str, content: str, name: str = "", replay: bool = False):
+        """发布一条消息并唤醒所有等待中的请求"""
+        self.messages.append(JobMessage(kind, content, name, replay))
+        self._wake()
+
+    def add_cleanup(self, func: Callable[[], None]):
+        """登记在所有请求都收到结果后执行的清理函数"""
+        self._cleanups.append(func)
+
+    async def follow(self, start: int, subscriber: str = ""):
+        """按顺序读取消息直到任务结束或请求者退出
+
+        Args:
+            start: 加入时的消息位置，此前的消息只补发结果类消息
+            subscriber: 请求者ID
+        """
+        follow_id = next(self._follow_ids)
+        self._followers[follow_id] = subscriber
+        try:
+            async for message in self._follow(start, follow_id):
+                yield message
+        finally:
+            del self._followers[follow_id]
+            self._detached.discard(follow_id)
+
+    async def _follow(self, start: int, follow_id: int):
+        pos = 0
+        while follow_id not in self._detached:
+            while pos < len(self.messages) and follow_id not in self._detached:
+                message = self.messages[pos]
+                pos += 1
+                if pos > start or message.replay:
+                    yield message
+            if self.finished:
+                return
+            await self._updated.wait()
+
+    def release(self):
+        """请求读取结束（正常结束或中途断开）"""
+        self.refs -= 1
+        self._maybe_cleanup()
+
+    def _close(self):
+        self.finished = True
+        self._wake()
+        self._maybe_cleanup()
+
+    def _wake(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def _maybe_cleanup(self):
+        if not self.finished or self.refs > 0:
+            return
+        self.registry.remove(self)
+        for func in self._cleanups:
+            try:
+                func()
+            except Exception as e:
+                logger.warning(f"任务 {self.key} 清理失败: {str(e)}")
+        self._cleanups.clear()
+
+
+class InflightRegistry:
+    """进行中任务的登记表，以漫画ID为键"""
+
+    def __init__(self):
+        self._jobs: Dict[str, InflightJob] = {}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def get(self, key: str) -> Optional[InflightJob]:
+        return self._jobs.get(key)
+
+    def acquire(self, key: str) -> Tuple[InflightJob, int, bool]:
+        """加入已有任务或登记新任务
+
+        Args:
+            key: 任务键（漫画ID）
+
+        Returns:
+            (任务, 加入时的消息位置, 是否为新登记的任务)；
+            调用方读取结束后必须调用 job.release()
+        """
+        job = self._jobs.get(key)
+        created = job is None
+        if created:
+            job = InflightJob(key, self)
+            self._jobs[key] = job
+        job.refs += 1
+        return job, len(job.messages), created
+
+    def remove(self, job: InflightJob):
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+
+    def cancel_all(self, message: str = "❌ 任务已取消"):
+        """取消所有进行中的任务（插件卸载时）"""
+        for job in list(self._jobs.values()):
+            job.cancel(message)
@@ -0,0 +1,229 @@
+"""任务队列模块
+
+所有下载任务的唯一调度器：按优先级和提交顺序排队，
+报告准确的排队位置，支持取消，并持久化到SQLite以便重启后继续
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional
+
+from astrbot.api import logger
+
+# 优先级：管理员 > 白名单用户 > 普通用户
+PRIORITY_ADMIN = 2
+PRIORITY_WHITELIST = 1
+PRIORITY_NORMAL = 0
+
+
+class QueueEntry:
+    """队列中的一个下载任务（每个漫画ID最多一个）"""
+
+    def __init__(self, row_id: int, comic_id: str, priority: int, created: float, requesters: List[dict]):
+        """初始化队列项
+
+        Args:
+            row_id: 数据库中的行ID，同优先级时按其先后排队
+            comic_id: 漫画ID
+            priority: 优先级，数值越大越先执行
+            created: 提交时间
+            requesters: 请求者列表，每项包含 sender（用户ID）与 umo（会话标识）
+        """
+        self.id = row_id
+        self.comic_id = comic_id
+        self.priority = priority
+        self.created = created
+        self.requesters = requesters
+        self.running = False
+        # 最近一次通知的排队位置
+        self.position: Optional[int] = None
+        # 排队位置变化时的回调，参数为前方任务数
+        self.on_position: Optional[Callable[[int], None]] = None
+        self._turn = asyncio.get_running_loop().create_future()
+
+    @property
+    def sort_key(self):
+        return (-self.priority, self.id)
+
+    def has_requester(self, sender: str) -> bool:
+        return any(r["sender"] == sender for r in self.requesters)
+
+
+class JobQueue:
+    """持久化的优先级任务队列
+
+    同优先级先进先出；同时执行的任务数由 max_concurrent_tasks 决定（动态读取配置）；
+    排队中和执行中的任务都记录在SQLite中，插件重启后执行中的任务重新排队
+    """
+
+    def __init__(self, config_manager):
+        """初始化任务队列
+
+        Args:
+            config_manager: 配置管理器实例
+        """
+        self.config_manager = config_manager
+        self._db: Optional[sqlite3.Connection] = None
+        self._entries: Dict[str, QueueEntry] = {}
+        # 插件卸载中：此时结束的任务保留在数据库中，重启后继续
+        self.closing = False
+
+    def open(self, path: str) -> List[QueueEntry]:
+        """打开数据库并恢复上次未完成的任务
+
+        Args:
+            path: SQLite数据库路径
+
+        Returns:
+            恢复的队列项，按执行顺序排列
+        """
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "comic_id TEXT NOT NULL UNIQUE, "
+            "priority INTEGER NOT NULL, "
+            "created REAL NOT NULL, "
+            "requesters TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+        restored = []
+        for row_id, comic_id, priority, created, requesters in self._db.execute(
+            "SELECT id, comic_id, priority, created, requesters FROM jobs"
+        ):
+            entry = QueueEntry(row_id, comic_id, priority, created, json.loads(requesters))
+            self._entries[comic_id] = entry
+            restored.append(entry)
+        restored.sort(key=lambda e: e.sort_key)
+        if restored:
+            logger.info(f"恢复了 {len(restored)} 个未完成的下载任务")
+        return restored
+
+    def close(self):
+        """插件卸载：保留未完成的任务并关闭数据库"""
+        self.closing = True
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def get(self, comic_id: str) -> Optional[QueueEntry]:
+        return self._entries.get(comic_id)
+
+    def submit(self, comic_id: str, priority: int, sender: str, umo: str) -> QueueEntry:
+        """提交下载任务；同一漫画已在队列中时加入该任务
+
+        Args:
+            comic_id: 漫画ID
+            priority: 优先级
+            sender: 请求者用户ID
+            umo: 请求者会话标识，重启后用于发送结果
+
+        Returns:
+            队列项
+        """
+        entry = self._entries.get(comic_id)
+        if entry is None:
+            created = time.time()
+            requesters = [{"sender": sender, "umo": umo}]
+            cursor = self._db.execute(
+                "INSERT INTO jobs (comic_id, priority, created, requesters) VALUES (?, ?, ?, ?)",
+                (comic_id, priority, created, json.dumps(requesters)),
+            )
+            self._db.commit()
+            entry = QueueEntry(cursor.lastrowid, comic_id, priority, created, requesters)
+            self._entries[comic_id] = entry
+        else:
+            if not entry.has_requester(sender):
+                entry.requesters.append({"sender": sender, "umo": umo})
+            # 高优先级的请求者加入时提升整个任务的优先级
+            entry.priority = max(entry.priority, priority)
+            self._update(entry)
+        self._notify_positions()
+        return entry
+
+    def position(self, entry: QueueEntry) -> int:
+        """前方还有多少个排队中的任务（执行中的任务返回0）"""
+        if entry.running:
+            return 0
+        return sum(
+            1 for other in self._entries.values()
+            if not other.running and other.sort_key < entry.sort_key
+        )
+
+    async def wait_turn(self, entry: QueueEntry):
+        """等待轮到该任务执行"""
+        await entry._turn
+
+    def finish(self, entry: QueueEntry):
+        """任务结束（完成、失败或取消），从队列中移除并调度下一个任务"""
+        if self.closing:
+            return
+        if self._entries.get(entry.comic_id) is entry:
+            del self._entries[entry.comic_id]
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (entry.id,))
+            self._db.commit()
+        self.dispatch()
+        self._notify_positions()
+
+    def cancel(self, comic_id: str, sender: str, force: bool = False) -> str:
+        """取消请求者对某个漫画的请求
+
+        Args:
+            comic_id: 漫画ID
+            sender: 请求者用户ID
+            force: 是否无视其他请求者直接取消整个任务（管理员）
+
+        Returns:
+            "not_found": 没有该请求者的任务；
+            "detached": 只移除了该请求者，任务仍为其他请求者继续；
+            "cancelled": 没有其他请求者，整个任务应被取消
+        """
+        entry = self._entries.get(comic_id)
+        if entry is None or not (force or entry.has_requester(sender)):
+            return "not_found"
+        entry.requesters = [r for r in entry.requesters if r["sender"] != sender]
+        if entry.requesters and not force:
+            self._update(entry)
+            return "detached"
+        return "cancelled"
+
+    def _update(self, entry: QueueEntry):
+        self._db.execute(
+            "UPDATE jobs SET priority = ?, requesters = ? WHERE id = ?",
+            (entry.priority, json.dumps(entry.requesters), entry.id),
+        )
+        self._db.commit()
+
+    def dispatch(self):
+        """在并发限制内按顺序启动排队中的任务"""
+        max_concurrent = self.config_manager.get_config_value('max_concurrent_tasks', 2)
+        running = sum(1 for e in self._entries.values() if e.running)
+        waiting = sorted(
+            (e for e in self._entries.values() if not e.running and not e._turn.done()),
+            key=lambda e: e.sort_key,
+        )
+        started = False
+        for entry in waiting:
+            if max_concurrent > 0 and running >= max_concurrent:
+                break
+            entry.running = True
+            entry._turn.set_result(None)
+            running += 1
+            started = True
+        if started:
+            self._notify_positions()
+
+    def _notify_positions(self):
+        """排队位置发生变化时通知对应任务"""
+        for entry in self._entries.values():
+            if entry.running:
+                continue
+            position = self.position(entry)
+            if position != entry.position:
+                entry.position = position
+                if entry.on_position is not None:
+                    entry.on_position(position)
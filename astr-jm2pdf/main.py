@@ -2,7 +2,7 @@ import os
 import re
 import asyncio
 
-from astrbot.api.event import filter, AstrMessageEvent
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger
 
@@ -12,6 +12,9 @@ from .permission import PermissionChecker
 from .downloader import ComicDownloader
 from .converter import PDFConverter
 from .task_executor import TaskExecutor
+from .inflight import InflightRegistry
+from .cache import PDFCache
+from .job_queue import JobQueue
 
 try:
     import jmcomic
@@ -19,9 +22,9 @@ except ImportError:
     jmcomic = None
 
 try:
-    import img2pdf
+    import PIL
 except ImportError:
-    img2pdf = None
+    PIL = None
 
 
 @register("astr-jm2pdf", "jiang068", "下载禁漫天堂漫画并转换为PDF", "1.0.4", "https://github.com/jiang068/astr-jm2pdf")
@@ -30,33 +33,32 @@ class JM2PDFPlugin(Star):
         super().__init__(context)
         # 保存插件配置
         self.plugin_config = config if config is not None else {}
-        # 任务信号量（用于限制并发任务数）
-        self._task_semaphore = None
-        # 当前排队数（用于显示）
-        self._queue_count = 0
         
         # 初始化模块
         self.config_manager = ConfigManager(self.plugin_config)
         self.permission_checker = PermissionChecker(self.config_manager)
         self.downloader = ComicDownloader(self.config_manager)
         self.converter = PDFConverter(self.config_manager)
-        self.task_executor = TaskExecutor(self.config_manager, self.downloader, self.converter)
+        self.pdf_cache = PDFCache(self.config_manager)
+        self.task_executor = TaskExecutor(self.config_manager, self.downloader, self.converter, self.pdf_cache)
+        # 进行中的任务（同一漫画只下载转换一次）
+        self.inflight = InflightRegistry()
+        # 下载任务队列（所有下载任务的唯一调度器）
+        self.job_queue = JobQueue(self.config_manager)
         
     async def initialize(self):
         """插件初始化"""
         # 检查依赖
         if jmcomic is None:
             logger.error("jmcomic 模块未安装，请使用 pip install jmcomic 安装")
-        if img2pdf is None:
-            logger.error("img2pdf 模块未安装，请使用 pip install img2pdf 安装")
+        if PIL is None:
+            logger.error("Pillow 模块未安装，请使用 pip install Pillow 安装")
         
-        # 初始化任务信号量
+        # 并发限制由任务队列在调度时动态读取
         max_concurrent = self.config_manager.get_config_value('max_concurrent_tasks', 2)
         if max_concurrent > 0:
-            self._task_semaphore = asyncio.Semaphore(max_concurrent)
             logger.info(f"任务并发限制: 最多 {max_concurrent} 个任务同时运行")
         else:
-            self._task_semaphore = None
             logger.info("任务并发限制: 无限制")
         
         # 获取配置并显示（强制输出，不受日志级别限制）
@@ -68,6 +70,13 @@ class JM2PDFPlugin(Star):
         proxy = self.config_manager.get_config_value('proxy', '')
         if proxy:
             logger.info(f"使用代理: {proxy}")
+        if self.pdf_cache.enabled:
+            self.pdf_cache.load(self.config_manager.get_download_dir())
+        
+        # 打开任务队列，继续上次未完成的任务
+        download_dir = self.config_manager.get_download_dir()
+        for entry in self.job_queue.open(os.path.join(download_dir, "jobs.db")):
+            self._resume_task(entry, download_dir)
 
     @filter.command("jm")
     async def download_jm_comic(self, event: AstrMessageEvent, comic_id: str):
@@ -88,8 +97,8 @@ class JM2PDFPlugin(Star):
             return
         
         # 检查依赖
-        if jmcomic is None or img2pdf is None:
-            yield event.plain_result("❌ 缺少必要的依赖库，请先安装 jmcomic 和 img2pdf")
+        if jmcomic is None or PIL is None:
+            yield event.plain_result("❌ 缺少必要的依赖库，请先安装 jmcomic 和 Pillow")
             return
         
         # 验证漫画ID格式（应该是纯数字）
@@ -101,61 +110,175 @@ class JM2PDFPlugin(Star):
         send_progress = self.config_manager.get_config_value('send_progress_message', True)
         download_dir = self.config_manager.get_download_dir()  # 动态获取下载目录
         
-        # 检查是否已存在PDF文件
-        expected_pdf_path = os.path.join(download_dir, f"jm_{comic_id}.pdf")
-        if os.path.exists(expected_pdf_path):
-            logger.info(f"发现已存在的PDF文件: {expected_pdf_path}")  # 关键日志，强制输出
-            if send_progress:
-                yield event.plain_result(f"� 检测到已下载的PDF，直接发送...")
-            
-            # 直接发送已存在的PDF
-            pdf_size = os.path.getsize(expected_pdf_path) / (1024 * 1024)  # MB
-            max_size = self.config_manager.get_config_value('max_file_size_mb', 0)
-            
-            if max_size > 0 and pdf_size > max_size:
-                yield event.plain_result(f"⚠️ PDF文件过大 ({pdf_size:.2f}MB > {max_size}MB)，无法发送")
-                return
+        # 同一漫画已有任务在进行时，加入该任务，不重复下载
+        job, start, created = self.inflight.acquire(comic_id)
+        try:
+            if created:
+                # 查询PDF缓存
+                cached_pdf_path = None
+                if self.pdf_cache.enabled:
+                    self.pdf_cache.load(download_dir)
+                    cached_pdf_path = self.pdf_cache.get(comic_id)
+                # 检查是否已存在PDF文件
+                expected_pdf_path = os.path.join(download_dir, f"jm_{comic_id}.pdf")
+                if cached_pdf_path:
+                    # 发送期间锁定，避免被淘汰
+                    self.pdf_cache.pin(comic_id)
+                    job.add_cleanup(lambda: self.pdf_cache.unpin(comic_id))
+                    job.start(self._send_existing_pdf(job, comic_id, cached_pdf_path, send_progress))
+                elif os.path.exists(expected_pdf_path):
+                    job.start(self._send_existing_pdf(job, comic_id, expected_pdf_path, send_progress))
+                else:
+                    entry = self.job_queue.submit(
+                        comic_id,
+                        self.permission_checker.get_priority(event),
+                        str(event.get_sender_id()),
+                        event.unified_msg_origin,
+                    )
+                    job.start(self._run_download_task(job, entry, send_progress, download_dir))
+            else:
+                logger.info(f"漫画 {comic_id} 已在处理中，用户 {event.get_sender_id()} 加入该任务")
+                if self.job_queue.get(comic_id) is not None:
+                    # 记录请求者，并按其优先级提升任务优先级
+                    self.job_queue.submit(
+                        comic_id,
+                        self.permission_checker.get_priority(event),
+                        str(event.get_sender_id()),
+                        event.unified_msg_origin,
+                    )
+                if send_progress:
+                    yield event.plain_result(f"🔗 漫画 {comic_id} 正在处理中，完成后会一并发送给您")
             
-            logger.info(f"PDF已发送: {expected_pdf_path}")  # 关键日志，强制输出
-            from astrbot.api.message_components import File
-            yield event.chain_result([File(file=expected_pdf_path, name=f"jm_{comic_id}.pdf")])
+            async for message in job.follow(start, str(event.get_sender_id())):
+                if message.kind == "file":
+                    from astrbot.api.message_components import File
+                    yield event.chain_result([File(file=message.content, name=message.name)])
+                else:
+                    yield event.plain_result(message.content)
+        finally:
+            job.release()
+
+    async def _send_existing_pdf(self, job, comic_id: str, pdf_path: str, send_progress: bool):
+        """直接发送已存在的PDF"""
+        logger.info(f"发现已存在的PDF文件: {pdf_path}")  # 关键日志，强制输出
+        if send_progress:
+            job.publish("plain", f"📄 检测到已下载的PDF，直接发送...")
+        
+        pdf_size = os.path.getsize(pdf_path) / (1024 * 1024)  # MB
+        max_size = self.config_manager.get_config_value('max_file_size_mb', 0)
+        
+        if max_size > 0 and pdf_size > max_size:
+            job.publish("plain", f"⚠️ PDF文件过大 ({pdf_size:.2f}MB > {max_size}MB)，无法发送", replay=True)
             return
         
-        # 任务队列控制
-        if self._task_semaphore is not None:
-            # 检查当前是否需要排队
-            if self._task_semaphore.locked():
-                self._queue_count += 1
-                queue_position = self._queue_count
-                logger.info(f"任务队列已满，用户 {event.get_sender_id()} 排队中，前方 {queue_position} 个任务")
+        logger.info(f"PDF已发送: {pdf_path}")  # 关键日志，强制输出
+        job.publish("file", pdf_path, f"jm_{comic_id}.pdf", replay=True)
+
+    async def _run_download_task(self, job, entry, send_progress: bool, download_dir: str):
+        """排队并执行下载任务，消息发布给所有加入该任务的请求"""
+        comic_id = entry.comic_id
+        
+        def on_position(position: int):
+            # 前方任务完成或被取消时通知新的排队位置
+            if send_progress:
+                job.publish("plain", f"📊 排队位置更新：前方还有 {position} 个任务")
+        
+        try:
+            self.job_queue.dispatch()
+            if not entry.running:
+                position = self.job_queue.position(entry)
+                entry.position = position
+                entry.on_position = on_position
+                logger.info(f"任务队列已满，漫画 {comic_id} 排队中，前方 {position} 个任务")
                 if send_progress:
-                    yield event.plain_result(f"⏳ 当前下载任务较多，您的请求正在排队...\n📊 前方还有 {queue_position} 个任务")
+                    job.publish("plain", f"⏳ 当前下载任务较多，您的请求正在排队...\n📊 前方还有 {position} 个任务")
                 
-                # 等待获取信号量
-                async with self._task_semaphore:
-                    self._queue_count -= 1
-                    logger.info(f"用户 {event.get_sender_id()} 的任务开始执行")
-                    if send_progress:
-                        yield event.plain_result(f"✅ 轮到您了！开始下载漫画 {comic_id}...")
-                    # 执行实际下载任务
-                    async for result in self.task_executor.execute_download_task(event, comic_id, send_progress, download_dir):
-                        yield result
+                # 等待轮到该任务
+                await self.job_queue.wait_turn(entry)
+                logger.info(f"漫画 {comic_id} 的任务开始执行")
+                if send_progress:
+                    job.publish("plain", f"✅ 轮到您了！开始下载漫画 {comic_id}...")
             else:
-                # 直接获取信号量并执行
-                async with self._task_semaphore:
-                    logger.info(f"用户 {event.get_sender_id()} 的任务立即开始")
-                    if send_progress:
-                        yield event.plain_result(f"📥 开始下载漫画 {comic_id}，请稍候...")
-                    async for result in self.task_executor.execute_download_task(event, comic_id, send_progress, download_dir):
-                        yield result
+                logger.info(f"漫画 {comic_id} 的任务立即开始")
+                if send_progress:
+                    job.publish("plain", f"📥 开始下载漫画 {comic_id}，请稍候...")
+            
+            # 执行实际下载任务
+            await self.task_executor.execute_download_task(job, comic_id, send_progress, download_dir)
+        finally:
+            self.job_queue.finish(entry)
+
+    def _resume_task(self, entry, download_dir: str):
+        """继续上次插件停止时未完成的任务，结果主动发送给原请求者"""
+        job, start, created = self.inflight.acquire(entry.comic_id)
+        send_progress = self.config_manager.get_config_value('send_progress_message', True)
+        job.start(self._run_download_task(job, entry, send_progress, download_dir))
+        asyncio.create_task(self._forward_results(job, entry))
+
+    async def _forward_results(self, job, entry):
+        """把恢复的任务的结果发送给原请求者（已重新发起请求的用户由其请求接收）"""
+        from astrbot.api.message_components import File, Plain
+        
+        requesters = list(entry.requesters)
+        for requester in requesters:
+            try:
+                await self.context.send_message(
+                    requester["umo"],
+                    MessageChain(chain=[Plain(f"🔄 插件已重启，继续处理漫画 {entry.comic_id}")]),
+                )
+            except Exception as e:
+                logger.warning(f"发送恢复通知失败: {str(e)}")
+        
+        try:
+            async for message in job.follow(0):
+                # 只转发结果类消息，进度消息不主动推送
+                if not message.replay:
+                    continue
+                if message.kind == "file":
+                    chain = MessageChain(chain=[File(file=message.content, name=message.name)])
+                else:
+                    chain = MessageChain(chain=[Plain(message.content)])
+                for requester in requesters:
+                    sender = requester["sender"]
+                    # 已取消的请求者不再发送，重新发起请求的请求者由其请求接收
+                    if not entry.has_requester(sender) or job.is_following(sender):
+                        continue
+                    try:
+                        await self.context.send_message(requester["umo"], chain)
+                    except Exception as e:
+                        logger.warning(f"发送恢复任务结果失败: {str(e)}")
+        finally:
+            job.release()
+
+    @filter.command("jmcancel", alias={"jm取消"})
+    async def cancel_jm_comic(self, event: AstrMessageEvent, comic_id: str):
+        """取消自己的下载请求（管理员可取消任意任务）
+        
+        使用方法: /jmcancel <漫画ID>
+        示例: /jmcancel 123456
+        """
+        sender = str(event.get_sender_id())
+        result = self.job_queue.cancel(comic_id, sender, force=event.is_admin())
+        if result == "not_found":
+            yield event.plain_result(f"❌ 没有找到您对漫画 {comic_id} 的下载任务")
+            return
+        
+        job = self.inflight.get(comic_id)
+        if result == "detached":
+            # 其他用户仍在等待该漫画，只移除当前用户
+            if job is not None:
+                job.detach(sender)
+            logger.info(f"用户 {sender} 退出了漫画 {comic_id} 的任务")
+            yield event.plain_result(f"✅ 已取消您的请求，其他用户对漫画 {comic_id} 的请求仍在进行")
         else:
-            # 没有并发限制，直接执行
-            logger.info(f"开始处理漫画 ID: {comic_id}")
-            if send_progress:
-                yield event.plain_result(f"📥 开始下载漫画 {comic_id}，请稍候...")
-            async for result in self.task_executor.execute_download_task(event, comic_id, send_progress, download_dir):
-                yield result
+            if job is not None:
+                job.cancel(f"❌ 漫画 {comic_id} 的下载任务已取消")
+            logger.info(f"用户 {sender} 取消了漫画 {comic_id} 的任务")
+            yield event.plain_result(f"✅ 已取消漫画 {comic_id} 的下载任务")
 
     async def terminate(self):
         """插件卸载时的清理工作"""
+        # 先关闭队列，使未完成的任务保留在数据库中，重启后继续
+        self.job_queue.close()
+        self.inflight.cancel_all("⏸️ 插件正在重载，任务将在插件重启后继续")
         logger.info("JM2PDF 插件已卸载")
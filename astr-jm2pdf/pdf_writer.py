@@ -0,0 +1,312 @@
+"""流式PDF写入模块
+
+逐页把图片写入PDF文件，内存占用与单页图片相当，与总页数无关
+"""
+import os
+import shutil
+import struct
+import zlib
+from typing import List
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# JPEG直接拷贝文件内容的块大小
+COPY_CHUNK = 256 * 1024
+# Flate压缩时每次送入的原始数据大小
+COMPRESS_CHUNK = 1024 * 1024
+# 图片没有DPI信息时按96 DPI计算页面尺寸（与img2pdf一致）
+DEFAULT_DPI = 96
+# EXIF方向 -> 页面/Rotate，镜像等其余取值忽略（对应img2pdf的Rotation.ifvalid）
+EXIF_ROTATION = {3: 180, 6: 90, 8: 270}
+
+
+class StreamingPDFWriter:
+    """流式PDF写入器
+
+    Catalog写在文件开头，每张图片处理完立即写出图片、内容流与页面对象，
+    /Pages对象与交叉引用表在关闭时写在文件末尾；
+    JPEG图片以DCTDecode原样写入（无损、无需解码），
+    8位不透明的PNG直接拷贝IDAT压缩数据，
+    其余格式解码后以FlateDecode无损压缩，透明通道铺白底
+    """
+
+    def __init__(self, path: str):
+        """初始化写入器并写入文件头
+
+        Args:
+            path: 输出PDF路径
+        """
+        self.path = path
+        self._file = open(path, "wb")
+        # 下标为对象编号，0号对象保留
+        self._offsets: List[int] = [0]
+        self._pages: List[int] = []
+        self._closed = False
+
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._catalog = self._alloc()
+        self._pages_root = self._alloc()
+        self._write_obj(self._catalog, b"<< /Type /Catalog /Pages %d 0 R >>" % self._pages_root)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _alloc(self) -> int:
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def _begin(self, num: int):
+        self._offsets[num] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % num)
+
+    def _write_obj(self, num: int, body: bytes):
+        self._begin(num)
+        self._file.write(body)
+        self._file.write(b"\nendobj\n")
+
+    def add_image(self, image_path: str):
+        """把一张图片写为新的一页
+
+        图片在写入任何内容之前完成识别与解码，
+        无法识别的图片会直接抛出异常，已写入的内容不受影响
+
+        Args:
+            image_path: 图片路径
+        """
+        with Image.open(image_path) as img:
+            width, height = img.size
+            rotate = EXIF_ROTATION.get(img.getexif().get(0x0112), 0)
+            dpi = img.info.get("dpi") or (DEFAULT_DPI, DEFAULT_DPI)
+            jpeg = _jpeg_params(img)
+            png = _png_params(image_path) if img.format == "PNG" else None
+            if jpeg is None and png is None:
+                flat = _flatten(img)
+                mode = flat.mode
+                raw = flat.tobytes()
+                del flat
+
+        image_num = self._alloc()
+        if jpeg is not None:
+            self._write_jpeg(image_num, image_path, width, height, *jpeg)
+        elif png is not None:
+            self._write_png(image_num, image_path, width, height, *png)
+        else:
+            self._write_flate(image_num, raw, width, height, mode)
+            del raw
+
+        dpi_x = dpi[0] if dpi[0] > 0 else DEFAULT_DPI
+        dpi_y = dpi[1] if dpi[1] > 0 else DEFAULT_DPI
+        page_w = width * 72 / dpi_x
+        page_h = height * 72 / dpi_y
+
+        content = b"q %.4f 0 0 %.4f 0 0 cm /Im0 Do Q" % (page_w, page_h)
+        content_num = self._alloc()
+        self._write_obj(
+            content_num,
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        )
+
+        page_num = self._alloc()
+        page = (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.4f %.4f] "
+            b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R"
+            % (self._pages_root, page_w, page_h, image_num, content_num)
+        )
+        if rotate:
+            page += b" /Rotate %d" % rotate
+        self._write_obj(page_num, page + b" >>")
+        self._pages.append(page_num)
+
+    def _write_jpeg(self, num: int, image_path: str, width: int, height: int,
+                    colorspace: bytes, decode: bytes):
+        """JPEG以DCTDecode原样分块拷贝"""
+        length = os.path.getsize(image_path)
+        self._begin(num)
+        self._file.write(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace %s /BitsPerComponent 8%s /Filter /DCTDecode /Length %d >>\nstream\n"
+            % (width, height, colorspace, decode, length)
+        )
+        with open(image_path, "rb") as src:
+            shutil.copyfileobj(src, self._file, COPY_CHUNK)
+        self._file.write(b"\nendstream\nendobj\n")
+
+    def _write_png(self, num: int, image_path: str, width: int, height: int,
+                   colorspace: bytes, colors: int, length: int):
+        """PNG的IDAT数据本身就是PDF可用的Flate流，带上预测器参数原样拷贝"""
+        self._begin(num)
+        self._file.write(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace %s /BitsPerComponent 8 /Filter /FlateDecode "
+            b"/DecodeParms << /Predictor 15 /Colors %d /BitsPerComponent 8 /Columns %d >> "
+            b"/Length %d >>\nstream\n"
+            % (width, height, colorspace, colors, width, length)
+        )
+        with open(image_path, "rb") as src:
+            for chunk_type, size in _png_chunks(src):
+                if chunk_type == b"IDAT":
+                    _copy(src, self._file, size)
+                    src.seek(4, os.SEEK_CUR)
+                else:
+                    src.seek(size + 4, os.SEEK_CUR)
+        self._file.write(b"\nendstream\nendobj\n")
+
+    def _write_flate(self, num: int, raw: bytes, width: int, height: int, mode: str):
+        """解码后的像素以FlateDecode分块压缩写入，长度写在随后的独立对象中"""
+        colorspace = b"/DeviceGray" if mode == "L" else b"/DeviceRGB"
+        length_num = self._alloc()
+
+        self._begin(num)
+        self._file.write(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace %s /BitsPerComponent 8 /Filter /FlateDecode /Length %d 0 R >>\nstream\n"
+            % (width, height, colorspace, length_num)
+        )
+        view = memoryview(raw)
+        compressor = zlib.compressobj(6)
+        length = 0
+        for start in range(0, len(view), COMPRESS_CHUNK):
+            chunk = compressor.compress(view[start:start + COMPRESS_CHUNK])
+            length += len(chunk)
+            self._file.write(chunk)
+        chunk = compressor.flush()
+        length += len(chunk)
+        self._file.write(chunk)
+        self._file.write(b"\nendstream\nendobj\n")
+        self._write_obj(length_num, b"%d" % length)
+
+    def close(self) -> int:
+        """写入页面树与交叉引用表并关闭文件
+
+        Returns:
+            写入的页数
+        """
+        if self._closed:
+            return len(self._pages)
+        kids = b" ".join(b"%d 0 R" % num for num in self._pages)
+        self._write_obj(
+            self._pages_root,
+            b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._pages)),
+        )
+
+        xref = self._file.tell()
+        self._file.write(b"xref\n0 %d\n" % len(self._offsets))
+        self._file.write(b"0000000000 65535 f \n")
+        for offset in self._offsets[1:]:
+            self._file.write(b"%010d 00000 n \n" % offset)
+        self._file.write(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self._offsets), self._catalog, xref)
+        )
+        self._file.close()
+        self._closed = True
+        return len(self._pages)
+
+    def abort(self):
+        """放弃写入并删除未完成的文件"""
+        if not self._closed:
+            self._file.close()
+            self._closed = True
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _jpeg_params(img):
+    """可原样写入的JPEG返回(色彩空间, /Decode)，否则返回None"""
+    if img.format != "JPEG":
+        return None
+    if img.mode == "L":
+        return b"/DeviceGray", b""
+    if img.mode in ("RGB", "YCbCr"):
+        return b"/DeviceRGB", b""
+    if img.mode == "CMYK":
+        # Adobe写出的CMYK JPEG是反相存储的
+        if "adobe" in img.info:
+            return b"/DeviceCMYK", b" /Decode [1 0 1 0 1 0 1 0]"
+        return b"/DeviceCMYK", b""
+    return None
+
+
+def _png_chunks(src):
+    """依次产出PNG数据块的(类型, 长度)，调用方负责读取或跳过数据与CRC"""
+    src.seek(8)
+    while True:
+        header = src.read(8)
+        if len(header) < 8:
+            return
+        size, chunk_type = struct.unpack(">I4s", header)
+        yield chunk_type, size
+        if chunk_type == b"IEND":
+            return
+
+
+def _png_params(image_path: str):
+    """可原样写入的PNG返回(色彩空间, 通道数, IDAT总长度)，否则返回None
+
+    只接受8位、非隔行、无透明的灰度或RGB图片，其余情况（含文件不完整）需要解码
+    """
+    color_type = None
+    length = 0
+    with open(image_path, "rb") as src:
+        for chunk_type, size in _png_chunks(src):
+            if chunk_type == b"IHDR":
+                ihdr = src.read(size)
+                src.seek(4, os.SEEK_CUR)
+                _, _, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+                if bit_depth != 8 or interlace or color_type not in (0, 2):
+                    return None
+                continue
+            if chunk_type == b"tRNS":
+                return None
+            if chunk_type == b"IDAT":
+                length += size
+            src.seek(size + 4, os.SEEK_CUR)
+        # 数据块声明的长度超出文件末尾说明文件被截断
+        truncated = src.tell() > os.fstat(src.fileno()).st_size
+    if color_type is None or not length or truncated:
+        return None
+    if color_type == 0:
+        return b"/DeviceGray", 1, length
+    return b"/DeviceRGB", 3, length
+
+
+def _copy(src, dst, size: int):
+    """分块拷贝指定长度的数据"""
+    while size > 0:
+        chunk = src.read(min(size, COPY_CHUNK))
+        if not chunk:
+            raise EOFError("图片数据不完整")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def _flatten(img):
+    """转换为PDF可直接使用的灰度或RGB，透明部分铺白底"""
+    if img.mode in ("L", "RGB"):
+        return img
+    if img.mode == "I" or img.mode.startswith("I;16"):
+        # 16位灰度直接convert("L")会截断而不是缩放，几乎整页变白；先缩放到0~255
+        return img.convert("I").point(lambda v: v / 257).convert("L")
+    if img.mode in ("1", "F"):
+        return img.convert("L")
+    if "A" in img.getbands() or "transparency" in img.info:
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
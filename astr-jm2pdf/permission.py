@@ -5,6 +5,8 @@
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
 
+from .job_queue import PRIORITY_ADMIN, PRIORITY_WHITELIST, PRIORITY_NORMAL
+
 
 class PermissionChecker:
     """权限检查器"""
@@ -122,3 +124,24 @@ class PermissionChecker:
             # 在私聊中触发，允许继续
             logger.info("仅私聊模式已开启，当前为私聊消息，允许继续")
             return (False, "")
+    
+    def get_priority(self, event: AstrMessageEvent) -> int:
+        """获取用户请求在任务队列中的优先级
+        
+        Args:
+            event: 消息事件
+            
+        Returns:
+            管理员最高，其次是用户白名单中的用户，其余为普通优先级；
+            未开启优先级时所有请求都为普通优先级
+        """
+        if not self.config_manager.get_config_value('queue_priority', True):
+            return PRIORITY_NORMAL
+        if event.is_admin():
+            return PRIORITY_ADMIN
+        
+        whitelist_users_str = self.config_manager.get_config_value('whitelist_users', '')
+        whitelist_users = {u.strip() for u in whitelist_users_str.split(',') if u.strip()}
+        if str(event.get_sender_id()) in whitelist_users:
+            return PRIORITY_WHITELIST
+        return PRIORITY_NORMAL
@@ -7,30 +7,40 @@ import shutil
 import tempfile
 import asyncio
 
-from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
 
 
 class TaskExecutor:
     """任务执行器"""
     
-    def __init__(self, config_manager, downloader, converter):
+    def __init__(self, config_manager, downloader, converter, pdf_cache=None):
         """初始化任务执行器
         
         Args:
             config_manager: 配置管理器实例
             downloader: 下载器实例
             converter: PDF转换器实例
+            pdf_cache: PDF缓存实例（可选）
         """
         self.config_manager = config_manager
         self.downloader = downloader
         self.converter = converter
+        self.pdf_cache = pdf_cache
     
-    async def execute_download_task(self, event: AstrMessageEvent, comic_id: str, send_progress: bool, download_dir: str):
-        """执行下载任务的实际逻辑"""
+    async def execute_download_task(self, job, comic_id: str, send_progress: bool, download_dir: str):
+        """执行下载任务的实际逻辑
+        
+        Args:
+            job: 进行中的任务，进度与结果消息发布给所有加入该任务的请求
+            comic_id: 漫画ID
+            send_progress: 是否发送进度消息
+            download_dir: 下载目录
+        """
         
         temp_dir = None
         pdf_path = None
+        cached = False
+        builder = None
         download_timeout = False
         
         try:
@@ -38,6 +48,9 @@ class TaskExecutor:
             temp_dir = tempfile.mkdtemp(prefix=f"jm_{comic_id}_", dir=download_dir)
             self.config_manager.log('info', f"临时下载目录: {temp_dir}")
             
+            # 边下载边转换：每完成一个章节就按顺序写入PDF
+            builder = self.converter.open_builder(comic_id, download_dir)
+            
             # 获取超时配置
             timeout_minutes = self.config_manager.get_config_value('task_timeout_minutes', 10)
             
@@ -46,7 +59,7 @@ class TaskExecutor:
                 timeout_seconds = timeout_minutes * 60
                 try:
                     await asyncio.wait_for(
-                        self.downloader.download_comic(comic_id, temp_dir),
+                        self.downloader.download_comic(comic_id, temp_dir, listener=builder),
                         timeout=timeout_seconds
                     )
                     logger.info(f"漫画 {comic_id} 下载完成")
@@ -54,19 +67,32 @@ class TaskExecutor:
                     download_timeout = True
                     logger.warning(f"漫画 {comic_id} 下载超时（{timeout_minutes}分钟），尝试转换已下载的图片")
                     if send_progress:
-                        yield event.plain_result(f"⚠️ 下载任务超时（{timeout_minutes}分钟），尝试转换已下载的图片...")
+                        job.publish("plain", f"⚠️ 下载任务超时（{timeout_minutes}分钟），尝试转换已下载的图片...")
             else:
                 # 无超时限制
-                await self.downloader.download_comic(comic_id, temp_dir)
+                await self.downloader.download_comic(comic_id, temp_dir, listener=builder)
                 logger.info(f"漫画 {comic_id} 下载完成")
             
             if not download_timeout and send_progress:
-                yield event.plain_result(f"✅ 下载完成，开始转换PDF...")
+                job.publish("plain", f"✅ 下载完成，正在生成PDF...")
             
-            # 转换为PDF
-            pdf_path = await self.converter.convert_to_pdf(comic_id, temp_dir, download_dir)
+            # 完成增量生成的PDF；未能增量生成时回退为整本转换
+            pdf_path = await builder.finish()
+            if pdf_path is None:
+                pdf_path = await self.converter.convert_to_pdf(comic_id, temp_dir, download_dir)
             self.config_manager.log('info', f"PDF 转换完成: {pdf_path}")
             
+            # 完整的PDF移入缓存（超时生成的部分内容不缓存）
+            if pdf_path and not download_timeout and self.pdf_cache is not None and self.pdf_cache.enabled:
+                self.pdf_cache.load(download_dir)
+                cached_path = self.pdf_cache.put(comic_id, pdf_path)
+                if cached_path:
+                    pdf_path = cached_path
+                    cached = True
+                    # 发送期间锁定，避免被淘汰
+                    self.pdf_cache.pin(comic_id)
+                    job.add_cleanup(lambda: self.pdf_cache.unpin(comic_id))
+            
             # 发送PDF文件
             if pdf_path and os.path.exists(pdf_path):
                 pdf_size = os.path.getsize(pdf_path) / (1024 * 1024)  # MB
@@ -75,42 +101,47 @@ class TaskExecutor:
                 max_file_size_mb = self.config_manager.get_config_value('max_file_size_mb', 0)
                 # 检查文件大小限制
                 if max_file_size_mb > 0 and pdf_size > max_file_size_mb:
-                    yield event.plain_result(
+                    job.publish(
+                        "plain",
                         f"⚠️ 警告: PDF文件过大 ({pdf_size:.2f} MB > {max_file_size_mb} MB)\n"
-                        f"可能发送失败或需要较长时间"
+                        f"可能发送失败或需要较长时间",
+                        replay=True,
                     )
                 
                 if send_progress:
                     if download_timeout:
-                        yield event.plain_result(f"✅ 已将部分下载的图片转换为PDF ({pdf_size:.2f} MB)，准备发送...")
+                        job.publish("plain", f"✅ 已将部分下载的图片转换为PDF ({pdf_size:.2f} MB)，准备发送...")
                     else:
-                        yield event.plain_result(f"✅ PDF生成成功 ({pdf_size:.2f} MB)，准备发送...")
+                        job.publish("plain", f"✅ PDF生成成功 ({pdf_size:.2f} MB)，准备发送...")
                 
-                # 使用消息链发送PDF文件
-                from astrbot.api.message_components import File
-                yield event.chain_result([File(file=pdf_path, name=f"jm_{comic_id}.pdf")])
+                # 发送PDF文件（中途加入的请求也会收到）
+                job.publish("file", pdf_path, f"jm_{comic_id}.pdf", replay=True)
                 
                 if download_timeout:
-                    logger.warning(f"PDF已发送（部分内容，因超时）: {pdf_path}")
+                    logger.warning(f"PDF已生成（部分内容，因超时）: {pdf_path}")
                     if send_progress:
-                        yield event.plain_result("⚠️ 注意：此PDF仅包含超时前下载的部分图片")
+                        job.publish("plain", "⚠️ 注意：此PDF仅包含超时前下载的部分图片", replay=True)
                 else:
-                    logger.info(f"PDF已发送: {pdf_path}")
+                    logger.info(f"PDF已生成: {pdf_path}")
             else:
                 if download_timeout:
-                    yield event.plain_result("❌ 下载超时且未能找到可转换的图片")
+                    job.publish("plain", "❌ 下载超时且未能找到可转换的图片", replay=True)
                 else:
-                    yield event.plain_result("❌ PDF文件生成失败")
+                    job.publish("plain", "❌ PDF文件生成失败", replay=True)
                 
         except asyncio.TimeoutError:
             # 这个异常已在上面处理，不应该到这里
             logger.error(f"意外的超时异常: {comic_id}")
-            yield event.plain_result(f"❌ 任务执行超时")
+            job.publish("plain", f"❌ 任务执行超时", replay=True)
         except Exception as e:
             logger.error(f"处理漫画 {comic_id} 时出错: {str(e)}", exc_info=True)
-            yield event.plain_result(f"❌ 处理失败: {str(e)}")
+            job.publish("plain", f"❌ 处理失败: {str(e)}", replay=True)
         
         finally:
+            # 出错时放弃未完成的PDF
+            if builder is not None:
+                builder.abort()
+            
             # 动态读取配置
             keep_images = self.config_manager.get_config_value('keep_images', False)
             keep_pdf = self.config_manager.get_config_value('keep_pdf', False)
@@ -123,10 +154,20 @@ class TaskExecutor:
                 except Exception as e:
                     logger.warning(f"清理临时目录失败: {str(e)}")
             
-            # 清理PDF文件（发送后）
-            if not keep_pdf and pdf_path and os.path.exists(pdf_path):
-                try:
-                    os.remove(pdf_path)
-                    self.config_manager.log('info', f"已清理PDF文件: {pdf_path}")
-                except Exception as e:
-                    logger.warning(f"清理PDF文件失败: {str(e)}")
+            # 清理PDF文件：等所有加入该任务的请求都发送完后再删除（缓存中的PDF由缓存管理）
+            if not keep_pdf and not cached and pdf_path:
+                job.add_cleanup(lambda: self._remove_pdf(pdf_path))
+    
+    def _remove_pdf(self, pdf_path: str):
+        """删除已发送的PDF文件
+        
+        Args:
+            pdf_path: PDF文件路径
+        """
+        if not os.path.exists(pdf_path):
+            return
+        try:
+            os.remove(pdf_path)
+            self.config_manager.log('info', f"已清理PDF文件: {pdf_path}")
+        except Exception as e:
+            logger.warning(f"清理PDF文件失败: {str(e)}")
@@ -0,0 +1,31 @@
+"""StreamingPDFWriter：解码后重新压缩的图片应与原图像素一致"""
+import os
+import sys
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+pypdf = pytest.importorskip("pypdf")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_writer import StreamingPDFWriter  # noqa: E402
+
+
+def test_16bit_grayscale_png_is_scaled(tmp_path):
+    values = [0, 257 * 10, 257 * 128, 65535]
+    img = Image.new("I;16", (len(values), 1))
+    img.putdata(values)
+    src = str(tmp_path / "page.png")
+    img.save(src)
+    with Image.open(src) as reopened:
+        assert reopened.mode.startswith("I")
+
+    out = str(tmp_path / "out.pdf")
+    with StreamingPDFWriter(out) as writer:
+        writer.add_image(src)
+    (image,) = pypdf.PdfReader(out).pages[0].images
+    page = image.image
+
+    assert page.mode == "L"
+    assert [page.getpixel((x, 0)) for x in range(len(values))] == [0, 10, 128, 255]
@@ -0,0 +1,16 @@
+'''
+以包的形式导入插件内的模块, 使相对导入可用且不触发main.py
+'''
+
+import importlib
+import sys
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+
+if str(PLUGIN_DIR.parent) not in sys.path:
+    sys.path.insert(0, str(PLUGIN_DIR.parent))
+
+
+def load(name: str):
+    return importlib.import_module(f'{PLUGIN_DIR.name}.{name}')
@@ -0,0 +1,118 @@
+'''
+压缩参数对流量与CPU的影响
+
+    python bench/compression.py [--rounds 30]
+
+通过本地模拟Core跑一组有代表性的流量(纯文本指令/上传截图/大段文字回复/合并转发),
+分别报告各压缩配置下每条消息的线上字节数与CPU时间; 需在装有AstrBot的环境中运行
+'''
+
+import argparse
+import asyncio
+import os
+import time
+from base64 import b64encode
+
+from _plugin import load
+from fake_core import FakeCore
+
+CoreConnection = load('connection').CoreConnection
+models = load('models')
+
+SETTINGS = [
+    ('关闭压缩', dict(compression=False)),
+    ('level=1', dict(compression_level=1)),
+    ('level=6', dict(compression_level=6)),
+    ('level=9', dict(compression_level=9)),
+    ('level=6,window=10', dict(compression_level=6, window_bits=10)),
+]
+
+
+def _panel_text(n: int) -> str:
+    return '\n'.join(
+        f'【角色{i}】等级90 命座{i % 7} 暴击率{60 + i % 30}% 暴伤{150 + i}%'
+        for i in range(n)
+    )
+
+
+def _scenarios():
+    screenshot = f'base64://{b64encode(os.urandom(400 * 1024)).decode()}'
+    node = [models.TextSegment(data=_panel_text(20)) for _ in range(30)]
+    return {
+        '纯文本指令': (
+            [models.Message(type='text', data='ys查询面板')],
+            [models.TextSegment(data='已完成刷新!')],
+        ),
+        '上传截图': (
+            [
+                models.Message(type='text', data='sr上传面板'),
+                models.Message(type='image', data=screenshot),
+            ],
+            [models.TextSegment(data='识别成功')],
+        ),
+        '大段文字回复': (
+            [models.Message(type='text', data='ys抽卡记录')],
+            [models.TextSegment(data=_panel_text(300))],
+        ),
+        '合并转发': (
+            [models.Message(type='text', data='ys帮助')],
+            [models.NodeSegment(data=node)],
+        ),
+    }
+
+
+async def run(name: str, settings: dict, rounds: int):
+    scenarios = _scenarios()
+    current = {}
+
+    def reply(msg, binary):
+        return models.MessageSend(
+            bot_id=msg.bot_id,
+            target_type='group',
+            target_id='1',
+            content=current['reply'],
+        )
+
+    core = FakeCore(reply=reply)
+    url = await core.start()
+    replies: asyncio.Queue = asyncio.Queue()
+
+    async def on_message(msg):
+        await replies.put(msg)
+
+    conn = CoreConnection(url, on_message, **settings)
+    conn.start()
+    await conn.wait_ready()
+
+    count = 0
+    cpu = time.process_time()
+    for request, response in scenarios.values():
+        current['reply'] = response
+        msg = models.MessageReceive(bot_id='onebot', user_id='1', content=request)
+        for _ in range(rounds):
+            await conn.try_send(msg)
+            await replies.get()
+            count += 1
+    cpu = time.process_time() - cpu
+
+    print(
+        f'{name:<20} 上行 {core.wire_in / count / 1024:8.1f}KB  '
+        f'下行 {core.wire_out / count / 1024:8.1f}KB  '
+        f'CPU {cpu / count * 1000:6.2f}ms/条  '
+        f'(未压缩 {(core.bytes_in + core.bytes_out) / count / 1024:.1f}KB)'
+    )
+    await conn.stop()
+    await core.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=30)
+    args = parser.parse_args()
+    print('(CPU为适配器与模拟Core合计, 两者在同一进程中)')
+    for name, settings in SETTINGS:
+        asyncio.run(run(name, settings, args.rounds))
+
+
+if __name__ == '__main__':
+    main()
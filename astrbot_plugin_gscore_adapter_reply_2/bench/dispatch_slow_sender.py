@@ -0,0 +1,68 @@
+'''
+慢发送场景下的回复分发
+
+    python bench/dispatch_slow_sender.py [--sessions 20] [--msgs 5] [--delay 0.05]
+
+模拟一个会话的平台发送极慢(如QQ大合并转发), 检查:
+- 同一会话内消息严格按序送达
+- 其他会话不被慢会话阻塞
+- 并发数不超过上限
+需在装有AstrBot的环境中运行
+'''
+
+import argparse
+import asyncio
+import time
+
+from _plugin import load
+
+SessionDispatcher = load('dispatch').SessionDispatcher
+
+
+async def run(sessions: int, msgs: int, delay: float, slow: float, cap: int):
+    dispatcher = SessionDispatcher(max_concurrency=cap)
+    delivered = {s: [] for s in range(sessions)}
+    done_at = {}
+    peak = 0
+    active = 0
+    start = time.perf_counter()
+
+    async def fake_send(session: int, seq: int):
+        nonlocal peak, active
+        active += 1
+        peak = max(peak, active)
+        # 0号会话模拟极慢的平台发送
+        await asyncio.sleep(slow if session == 0 else delay)
+        delivered[session].append(seq)
+        done_at[session] = time.perf_counter() - start
+        active -= 1
+
+    for seq in range(msgs):
+        for s in range(sessions):
+            dispatcher.submit(('bot', 'group', s), lambda s=s, q=seq: fake_send(s, q))
+
+    while dispatcher.stats()['sessions']:
+        await asyncio.sleep(0.01)
+
+    ordered = all(v == list(range(msgs)) for v in delivered.values())
+    others = max(t for s, t in done_at.items() if s != 0)
+    print(f'会话内有序: {ordered}')
+    print(f'并发峰值: {peak} (上限 {cap})')
+    print(f'慢会话完成: {done_at[0]:.2f}s, 其余会话全部完成: {others:.2f}s')
+    print(f'串行处理预计耗时: {slow * msgs + delay * msgs * (sessions - 1):.2f}s')
+    assert ordered and peak <= cap and others < done_at[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--msgs', type=int, default=5)
+    parser.add_argument('--delay', type=float, default=0.05)
+    parser.add_argument('--slow', type=float, default=1.0)
+    parser.add_argument('--cap', type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.msgs, args.delay, args.slow, args.cap))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+附件编码对事件循环延迟的影响
+
+    python bench/encode_lag.py [--size-mb 10] [--files 4]
+
+对比在事件循环中直接base64编码(旧实现)与AttachmentEncoder线程池编码时,
+事件循环的最大/平均调度延迟
+'''
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from base64 import b64encode
+from pathlib import Path
+
+from _plugin import load
+
+AttachmentEncoder = load('encoder').AttachmentEncoder
+
+TICK = 0.001
+
+
+async def _probe(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - t - TICK)
+
+
+async def _inline(paths):
+    for p in paths:
+        with open(p, 'rb') as f:
+            data = f.read()
+        b64encode(data).decode('utf-8')
+        await asyncio.sleep(0)
+
+
+async def _pooled(paths):
+    encoder = AttachmentEncoder(cache_bytes=0)
+    await asyncio.gather(*(encoder.encode_file(p) for p in paths))
+    encoder.shutdown()
+
+
+async def _measure(name, func, paths):
+    stop = asyncio.Event()
+    lags = []
+    probe = asyncio.create_task(_probe(stop, lags))
+    await asyncio.sleep(0.05)
+    t = time.perf_counter()
+    await func(paths)
+    cost = time.perf_counter() - t
+    stop.set()
+    await probe
+    print(
+        f'{name:<8} 耗时 {cost * 1000:8.1f}ms  '
+        f'循环延迟 max {max(lags) * 1000:7.2f}ms  '
+        f'avg {sum(lags) / len(lags) * 1000:6.3f}ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=10)
+    parser.add_argument('--files', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.files):
+            p = Path(tmp) / f'{i}.bin'
+            p.write_bytes(os.urandom(args.size_mb * 1024 * 1024))
+            paths.append(p)
+
+        print(f'{args.files} 个 {args.size_mb}MB 文件')
+        asyncio.run(_measure('inline', _inline, paths))
+        asyncio.run(_measure('pooled', _pooled, paths))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''
+Core卡死时切换到热备实例的耗时
+
+    python bench/failover.py [--settings 20/20,3/5] [--rate 50]
+
+每组心跳设置(间隔/超时)分别启动主、备两个独立进程中的FakeCore, 连接稳定后暂停主实例
+(SIGSTOP: 进程不再回应, 但TCP连接仍由内核维持), 期间按`--rate`条/秒持续发送, 报告:
+- 从暂停到路由切换至热备实例的耗时
+- 这段时间内发给卡死实例的消息数(实际会丢失)
+需在装有AstrBot的环境中运行(仅限Linux/macOS)
+'''
+
+import argparse
+import asyncio
+import time
+
+from _plugin import load
+from fake_core import CoreProcess
+
+CoreConnection = load('connection').CoreConnection
+CoreRouter = load('router').CoreRouter
+models = load('models')
+
+
+async def _ignore(msg):
+    pass
+
+
+async def run(ping_interval: float, ping_timeout: float, rate: float) -> dict:
+    primary, standby = CoreProcess(), CoreProcess()
+    urls = [await primary.start(), await standby.start()]
+    conns = [
+        CoreConnection(
+            url, _ignore, ping_interval=ping_interval, ping_timeout=ping_timeout
+        )
+        for url in urls
+    ]
+    router = CoreRouter(conns[:1], conns[1:], failback_delay=0)
+    router.start()
+    while not all(c.is_connect for c in conns):
+        await asyncio.sleep(0.05)
+
+    msg = models.MessageReceive(user_id='1', content=[models.Message('text', 'ys')])
+    lost = sent = 0
+    switched = None
+    primary.pause()
+    start = time.perf_counter()
+    deadline = start + ping_interval + ping_timeout + 15
+    while time.perf_counter() < deadline:
+        conn = router.pick('1')
+        if conn is conns[1]:
+            switched = time.perf_counter() - start
+            break
+        if conn is conns[0]:
+            lost += 1
+        await router.send('1', msg)
+        sent += 1
+        await asyncio.sleep(1 / rate)
+
+    primary.resume()
+    await router.stop()
+    await asyncio.gather(primary.stop(), standby.stop())
+    return {'switched': switched, 'sent': sent, 'lost': lost}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--settings', default='20/20,3/5', help='心跳间隔/超时, 逗号分隔多组')
+    parser.add_argument('--rate', type=float, default=50)
+    args = parser.parse_args()
+
+    for setting in args.settings.split(','):
+        interval, timeout = (float(v) for v in setting.split('/'))
+        r = await run(interval, timeout, args.rate)
+        took = f'{r["switched"]:6.2f}s' if r['switched'] is not None else '  未切换'
+        print(
+            f'心跳 {interval:g}s/超时 {timeout:g}s  切换耗时 {took}  '
+            f'期间发给卡死实例 {r["lost"]}/{r["sent"]} 条'
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
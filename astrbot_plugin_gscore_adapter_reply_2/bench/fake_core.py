@@ -0,0 +1,267 @@
+'''
+本地模拟的gsuid-core, 供基准测试使用
+
+收到消息后按`reply`构造回复并发回, 与真实的Core一样每条消息各自处理, 互不阻塞;
+同时统计收发的字节数
+(bytes_in/bytes_out为解压后的消息大小, wire_in/wire_out为TCP上的实际字节数);
+支持与适配器相同的msgpack子协议协商
+
+    python bench/fake_core.py [--delay 0.005] [--node-texts 30] [--node-images 5] ...
+
+以独立进程运行时, 首行输出监听地址, 之后从stdin逐行读取指令
+(`drop`断开所有连接, `stats`输出统计), stdin关闭后退出;
+压测时应使用独立进程(见`CoreProcess`), 避免Core构造/压缩大回复占用适配器的事件循环,
+测到的是模拟Core而不是适配器
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from base64 import b64encode
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+import websockets.server
+from websockets.legacy.server import WebSocketServerProtocol
+from msgspec import json as msgjson
+from msgspec import msgpack
+from websockets.exceptions import ConnectionClosed
+
+from _plugin import load
+
+codec = load('codec')
+models = load('models')
+
+
+@lru_cache(maxsize=8)
+def _blob(size: int) -> bytes:
+    return os.urandom(size)
+
+
+@lru_cache(maxsize=8)
+def _blob_b64(size: int) -> str:
+    return f'base64://{b64encode(_blob(size)).decode()}'
+
+
+def make_reply(
+    msg,
+    binary: bool,
+    text_size: int = 200,
+    image_count: int = 0,
+    image_size: int = 0,
+):
+    content = [models.TextSegment(data='x' * text_size)]
+    for _ in range(image_count):
+        data = _blob(image_size) if binary else _blob_b64(image_size)
+        content.append(models.ImageSegment(data=data))
+    return models.MessageSend(
+        bot_id=msg.bot_id,
+        bot_self_id=msg.bot_self_id,
+        msg_id=msg.msg_id,
+        target_type=msg.user_type,
+        target_id=msg.group_id or msg.user_id,
+        content=content,
+    )
+
+
+def node_reply(texts: int, images: int, image_size: int):
+    '''合并转发回复: texts段文本 + images张图片'''
+
+    def reply(msg, binary):
+        out = make_reply(msg, binary, image_count=images, image_size=image_size)
+        nodes = [models.TextSegment(data=f'第{i}条' * 20) for i in range(texts)]
+        out.content = [models.NodeSegment(data=nodes + out.content[1:])]
+        return out
+
+    return reply
+
+
+def _counting_protocol(core: 'FakeCore'):
+    class CountingProtocol(WebSocketServerProtocol):
+        def connection_made(self, transport):
+            write = transport.write
+
+            def counted(data):
+                core.wire_out += len(data)
+                write(data)
+
+            transport.write = counted
+            super().connection_made(transport)
+
+        def data_received(self, data):
+            core.wire_in += len(data)
+            super().data_received(data)
+
+    return CountingProtocol
+
+
+class FakeCore:
+    def __init__(
+        self,
+        reply: Optional[Callable] = None,
+        delay: float = 0,
+        msgpack: bool = True,
+        **server_kwargs,
+    ):
+        self.reply = reply or make_reply
+        self.delay = delay
+        self.msgpack = msgpack
+        self.server_kwargs = server_kwargs
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.wire_in = 0
+        self.wire_out = 0
+        self.received = 0
+        self.clients: List = []
+        self._server = None
+
+    async def start(self, bot_id: str = 'AstrBot') -> str:
+        self._server = await websockets.server.serve(
+            self._handle,
+            '127.0.0.1',
+            0,
+            max_size=2**26,
+            create_protocol=_counting_protocol(self),
+            subprotocols=(
+                [codec.MSGPACK_SUBPROTOCOL] if self.msgpack else None
+            ),  # type: ignore
+            **self.server_kwargs,
+        )
+        port = self._server.sockets[0].getsockname()[1]
+        return f'ws://127.0.0.1:{port}/ws/{bot_id}'
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def drop_clients(self):
+        for ws in list(self.clients):
+            await ws.close()
+
+    async def _handle(self, ws, path=None):
+        binary = ws.subprotocol == codec.MSGPACK_SUBPROTOCOL
+        decoder = (
+            msgpack.Decoder(models.MessageReceive)
+            if binary
+            else msgjson.Decoder(models.MessageReceive)
+        )
+        self.clients.append(ws)
+        tasks = set()
+        try:
+            async for raw in ws:
+                self.bytes_in += len(raw)
+                self.received += 1
+                # 接收循环不能等待回复发完, 否则断开时会卡住关闭握手
+                task = asyncio.create_task(self._respond(ws, decoder.decode(raw), binary))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionClosed:
+            pass
+        finally:
+            self.clients.remove(ws)
+            for task in tasks:
+                task.cancel()
+
+    async def _respond(self, ws, msg, binary: bool):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        out = self.reply(msg, binary)
+        if out is None:
+            return
+        data = codec.encode(out, binary)
+        self.bytes_out += len(data)
+        try:
+            await ws.send(data)
+        except ConnectionClosed:
+            pass
+
+
+class CoreProcess:
+    '''在子进程中运行的FakeCore, 接口与FakeCore一致'''
+
+    def __init__(self, *args: str):
+        self.args = args
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.wire_in = 0
+        self.wire_out = 0
+        self.received = 0
+        self._proc: Optional[asyncio.subprocess.Process] = None
+
+    async def start(self) -> str:
+        self._proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            os.path.abspath(__file__),
+            *self.args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        return (await self._proc.stdout.readline()).decode().strip()  # type: ignore
+
+    async def _command(self, cmd: str) -> str:
+        self._proc.stdin.write(f'{cmd}\n'.encode())  # type: ignore
+        await self._proc.stdin.drain()  # type: ignore
+        return (await self._proc.stdout.readline()).decode()  # type: ignore
+
+    async def drop_clients(self):
+        await self._command('drop')
+
+    def pause(self):
+        '''暂停进程(SIGSTOP): TCP连接仍由内核维持, 但不再回应任何消息与心跳'''
+        self._proc.send_signal(signal.SIGSTOP)  # type: ignore
+
+    def resume(self):
+        self._proc.send_signal(signal.SIGCONT)  # type: ignore
+
+    async def stop(self):
+        if self._proc is None:
+            return
+        self.resume()
+        for key, value in json.loads(await self._command('stats')).items():
+            setattr(self, key, value)
+        self._proc.stdin.close()  # type: ignore
+        await self._proc.wait()
+        self._proc = None
+
+
+async def _serve(args):
+    reply = make_reply
+    if args.node_texts or args.node_images:
+        reply = node_reply(args.node_texts, args.node_images, args.image_kb * 1024)
+    kwargs = {} if args.compression else {'compression': None}
+    core = FakeCore(reply=reply, delay=args.delay, msgpack=args.msgpack, **kwargs)
+    print(await core.start(), flush=True)
+
+    loop = asyncio.get_running_loop()
+    while line := await loop.run_in_executor(None, sys.stdin.readline):
+        cmd = line.strip()
+        if cmd == 'drop':
+            await core.drop_clients()
+            print('ok', flush=True)
+        elif cmd == 'stats':
+            stats = {
+                key: getattr(core, key)
+                for key in ('bytes_in', 'bytes_out', 'wire_in', 'wire_out', 'received')
+            }
+            print(json.dumps(stats), flush=True)
+    await core.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--delay', type=float, default=0)
+    parser.add_argument('--msgpack', action='store_true')
+    # 随机内容无法压缩, 默认不协商permessage-deflate, 以免压缩耗时掩盖其他开销
+    parser.add_argument('--compression', action='store_true')
+    parser.add_argument('--node-texts', type=int, default=0)
+    parser.add_argument('--node-images', type=int, default=0)
+    parser.add_argument('--image-kb', type=int, default=256)
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+'''
+上传前压缩图片对消息体积与Core端解码耗时的影响
+
+    python bench/image_shrink.py [--width 1290] [--height 2796] [--max-side 2048]
+
+生成一张接近手机截图的PNG(纯色块+细节噪点), 比较原图与各压缩参数下的:
+- base64后的消息体积
+- 压缩本身的耗时(在适配器的编码线程中)
+- Core端用Pillow解码的耗时
+需要安装Pillow
+'''
+
+import argparse
+import os
+import time
+from base64 import b64encode
+from io import BytesIO
+
+from PIL import Image
+
+from _plugin import load
+
+ImageShrinker = load('imaging').ImageShrinker
+
+
+def screenshot(width: int, height: int) -> bytes:
+    img = Image.new('RGB', (width, height), (245, 245, 245))
+    # 一半区域为随机噪点, 模拟游戏截图中的立绘与特效
+    noise = Image.frombytes('RGB', (width, height // 2), os.urandom(width * (height // 2) * 3))
+    img.paste(noise, (0, height // 4))
+    out = BytesIO()
+    img.save(out, 'PNG')
+    return out.getvalue()
+
+
+def decode_ms(data: bytes, rounds: int = 5) -> float:
+    t = time.perf_counter()
+    for _ in range(rounds):
+        with Image.open(BytesIO(data)) as img:
+            img.load()
+    return (time.perf_counter() - t) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=1290)
+    parser.add_argument('--height', type=int, default=2796)
+    parser.add_argument('--max-side', type=int, default=2048)
+    args = parser.parse_args()
+
+    data = screenshot(args.width, args.height)
+    print(
+        f'原图      base64 {len(b64encode(data)) / 1024:8.1f}KB  '
+        f'压缩 {0:7.1f}ms  解码 {decode_ms(data):7.1f}ms'
+    )
+    for fmt in ('jpeg', 'webp'):
+        for quality in (75, 85):
+            shrinker = ImageShrinker(args.max_side, fmt, quality)  # type: ignore
+            t = time.perf_counter()
+            out = shrinker.shrink(data)
+            cost = (time.perf_counter() - t) * 1000
+            assert out is not None
+            print(
+                f'{fmt:<4} q={quality} base64 {len(b64encode(out)) / 1024:8.1f}KB  '
+                f'压缩 {cost:7.1f}ms  解码 {decode_ms(out):7.1f}ms'
+            )
+
+
+if __name__ == '__main__':
+    main()
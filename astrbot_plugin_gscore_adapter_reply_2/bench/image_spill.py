@@ -0,0 +1,88 @@
+'''
+大图片落盘对内存峰值的影响
+
+    python bench/image_spill.py [--images 8] [--size-mb 4]
+
+模拟收到一条含多张大图的回复直到交给平台发送的过程, 用tracemalloc统计内存峰值:
+- legacy: 切片去掉`base64://`后交给Image.fromBase64, 平台层再解码一次
+- spill: 分块解码写入暂存目录, 只把文件路径交给平台
+需在装有AstrBot的环境中运行
+'''
+
+import argparse
+import asyncio
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+
+from msgspec import json as msgjson
+
+from _plugin import load
+
+models = load('models')
+codec = load('codec')
+FileSpool = load('spool').FileSpool
+
+
+def build_frame(images: int, size: int) -> bytes:
+    image = f'base64://{base64.b64encode(os.urandom(size)).decode()}'
+    content = [models.ImageSegment(data=image) for _ in range(images)]
+    return msgjson.encode(models.MessageSend(bot_id='onebot', content=content))
+
+
+async def legacy(frame: bytes, spool):
+    msg = codec.decode(frame, False)
+    del frame
+    chain = []
+    for seg in msg.content:
+        seg.data = seg.data[9:]
+        # 平台层发送前会把base64解码为图片内容
+        chain.append((seg.data, base64.b64decode(seg.data)))
+    return chain
+
+
+async def spill(frame: bytes, spool):
+    msg = codec.decode(frame, False)
+    del frame
+    chain = []
+    for seg in msg.content:
+        chain.append(await spool.store_base64('image.png', seg.data, 9, hold=True))
+        seg.data = None
+    for path in chain:
+        spool.release(path)
+    return chain
+
+
+def measure(name, func, frame_factory, spool):
+    frame = frame_factory()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    t = time.perf_counter()
+    result = asyncio.run(func(frame, spool))
+    cost = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    print(f'{name:<8} 内存峰值 {(peak - base) / 1024 / 1024:8.1f}MB  耗时 {cost * 1000:7.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--size-mb', type=int, default=4)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    frame_mb = len(build_frame(1, size)) * args.images / 1024 / 1024
+    print(f'{args.images} 张 {args.size_mb}MB 图片, 消息约 {frame_mb:.1f}MB (不计消息本身)')
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = FileSpool(tmp)
+        measure('legacy', legacy, lambda: build_frame(args.images, size), spool)
+        measure('spill', spill, lambda: build_frame(args.images, size), spool)
+
+
+if __name__ == '__main__':
+    main()
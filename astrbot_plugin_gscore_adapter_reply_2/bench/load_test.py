@@ -0,0 +1,286 @@
+'''
+适配器整体压测: 本地模拟的gsuid-core + 合成事件 + 假的平台发送
+
+    python bench/load_test.py [--scenarios text,image,node,storm] [--events 500]
+                              [--json result.json] [--max-p99-ms 500] [--min-rate 100]
+
+每个场景新建一个GsCoreAdapter连接到独立进程中的FakeCore, 并发投递合成的AstrMessageEvent,
+以`context.send_message`被调用的时刻作为送达, 统计吞吐、p50/p99延迟与丢失数:
+- text: 纯文本指令, 回复一段文本
+- image: 每条指令附带一张本地图片, 测试上行附件编码
+- node: 回复为合并转发(多段文本+多张`--node-image-kb`大小的图片)
+- storm: 纯文本指令在`--storm-duration`秒内均匀投递, 期间Core周期性断开所有连接,
+  测试重连与排队
+合成的附件为随机内容, 无法压缩, 因此默认不协商permessage-deflate(`--compression`开启);
+`--trace-memory`开启tracemalloc统计内存峰值(会显著拖慢吞吐, 建议单独运行);
+超过`--max-p99-ms`/低于`--min-rate`时以非零状态退出, 可接入CI检查性能回退;
+需在装有AstrBot的环境中运行
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from astrbot.core.message.components import Image, Plain
+from astrbot.core.platform.message_type import MessageType
+
+from _plugin import load
+from fake_core import CoreProcess
+
+models = load('models')
+GsCoreAdapter = load('main').GsCoreAdapter
+
+
+class FakeConfig(dict):
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+
+class FakeEvent:
+    '''on_all_message用到的AstrMessageEvent接口'''
+
+    def __init__(self, user_id: str, chain: List):
+        self.user_id = user_id
+        self.chain = chain
+        self.message_str = ''.join(c.text for c in chain if isinstance(c, Plain))
+        self.unified_msg_origin = f'aiocqhttp:FriendMessage:{user_id}'
+        self.message_obj = SimpleNamespace(message_id=user_id)
+
+    def get_platform_id(self):
+        return 'aiocqhttp'
+
+    def get_platform_name(self):
+        return 'aiocqhttp'
+
+    def get_self_id(self):
+        return '10000'
+
+    def get_sender_id(self):
+        return self.user_id
+
+    def get_sender_name(self):
+        return f'用户{self.user_id}'
+
+    def get_session_id(self):
+        return self.user_id
+
+    def get_group_id(self):
+        return ''
+
+    def get_messages(self):
+        return self.chain
+
+    def get_message_type(self):
+        return MessageType.FRIEND_MESSAGE
+
+    def is_admin(self):
+        return False
+
+
+class FakeContext:
+    '''记录每个会话首次被调用`send_message`的时间'''
+
+    def __init__(self):
+        self.delivered: Dict[str, float] = {}
+        self.calls = 0
+        self.done = asyncio.Event()
+        self.expected = 0
+
+    async def send_message(self, session, chain):
+        self.calls += 1
+        self.delivered.setdefault(session.session_id, time.perf_counter())
+        if len(self.delivered) >= self.expected:
+            self.done.set()
+        return True
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_scenario(name: str, args, images: List[str]) -> dict:
+    core_args = ['--delay', str(args.core_delay)]
+    if args.wire == 'msgpack':
+        core_args.append('--msgpack')
+    if args.compression:
+        core_args.append('--compression')
+    if name == 'node':
+        core_args += [
+            '--node-texts', str(args.node_texts),
+            '--node-images', str(args.node_images),
+            '--image-kb', str(args.node_image_kb),
+        ]
+    core = CoreProcess(*core_args)
+    url = await core.start()
+
+    context = FakeContext()
+    context.expected = args.events
+    config = FakeConfig(
+        BOT_ID='AstrBot',
+        IP='127.0.0.1',
+        PORT='0',
+        CORES=[url],
+        failback_delay=0,
+        wire_format=args.wire,
+        queue_maxsize=args.events,
+    )
+    adapter = GsCoreAdapter(context, config)  # type: ignore
+    await adapter.initialize()
+    await adapter.router.wait_ready()
+
+    events = []
+    for i in range(args.events):
+        chain = [Plain('ys今日素材')]
+        if name == 'image':
+            chain.append(Image.fromFileSystem(images[i % len(images)]))
+        events.append(FakeEvent(f'{name}{i}', chain))
+
+    storm: Optional[asyncio.Task] = None
+    if name == 'storm':
+
+        async def drop_loop():
+            while True:
+                await asyncio.sleep(args.storm_interval)
+                await core.drop_clients()
+
+        storm = asyncio.create_task(drop_loop())
+
+    if args.trace_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+
+    sem = asyncio.Semaphore(args.concurrency)
+    sent_at: Dict[str, float] = {}
+
+    # 断线风暴需要让指令分散在多次断线之间
+    spacing = args.storm_duration / args.events if name == 'storm' else 0
+
+    async def fire(i: int, event: FakeEvent):
+        if spacing:
+            await asyncio.sleep(i * spacing)
+        async with sem:
+            sent_at[event.user_id] = time.perf_counter()
+            await adapter.on_all_message(event)  # type: ignore
+
+    start = time.perf_counter()
+    await asyncio.gather(*(fire(i, e) for i, e in enumerate(events)))
+    try:
+        await asyncio.wait_for(context.done.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+
+    peak_mb = None
+    if args.trace_memory:
+        peak_mb = (tracemalloc.get_traced_memory()[1] - base) / 1024 / 1024
+        tracemalloc.stop()
+
+    if storm is not None:
+        storm.cancel()
+    await adapter.terminate()
+    await core.stop()
+
+    latencies = [
+        (t - sent_at[k]) * 1000 for k, t in context.delivered.items() if k in sent_at
+    ]
+    delivered = len(latencies)
+    # 吞吐按最后一条送达的时间计算, 超时等待不计入
+    last = max(context.delivered.values(), default=start) - start
+    return {
+        'scenario': name,
+        'events': args.events,
+        'delivered': delivered,
+        'lost': args.events - delivered,
+        'rate': delivered / last if last > 0 else 0,
+        'p50_ms': percentile(latencies, 0.5),
+        'p99_ms': percentile(latencies, 0.99),
+        'elapsed_s': elapsed,
+        'bytes_up': core.bytes_in,
+        'bytes_down': core.bytes_out,
+        'peak_mb': peak_mb,
+    }
+
+
+def report(r: dict):
+    mem = f'  内存峰值 {r["peak_mb"]:7.1f}MB' if r['peak_mb'] is not None else ''
+    print(
+        f'{r["scenario"]:<6} 送达 {r["delivered"]:>5}/{r["events"]:<5} '
+        f'吞吐 {r["rate"]:8.1f}条/s  p50 {r["p50_ms"]:8.1f}ms  p99 {r["p99_ms"]:8.1f}ms  '
+        f'上行 {r["bytes_up"] / 1024 / 1024:7.1f}MB  下行 {r["bytes_down"] / 1024 / 1024:7.1f}MB'
+        f'{mem}'
+    )
+
+
+async def run(args) -> List[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        images = []
+        for i in range(args.upload_files):
+            path = os.path.join(tmp, f'upload{i}.png')
+            with open(path, 'wb') as f:
+                f.write(b'\x89PNG\r\n\x1a\n' + os.urandom(args.image_kb * 1024))
+            images.append(path)
+        for name in args.scenarios.split(','):
+            result = await run_scenario(name.strip(), args, images)
+            report(result)
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default='text,image,node,storm')
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--wire', choices=('json', 'msgpack'), default='json')
+    parser.add_argument('--compression', action='store_true')
+    parser.add_argument('--core-delay', type=float, default=0.005)
+    parser.add_argument('--image-kb', type=int, default=256)
+    parser.add_argument('--upload-files', type=int, default=8)
+    parser.add_argument('--node-texts', type=int, default=30)
+    parser.add_argument('--node-images', type=int, default=5)
+    parser.add_argument('--node-image-kb', type=int, default=64)
+    parser.add_argument('--storm-interval', type=float, default=0.2)
+    parser.add_argument('--storm-duration', type=float, default=3)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--trace-memory', action='store_true')
+    parser.add_argument('--json', help='将结果写入该文件')
+    parser.add_argument('--max-p99-ms', type=float, default=0)
+    parser.add_argument('--min-rate', type=float, default=0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failed = []
+    for r in results:
+        # 断线风暴中正在处理的指令会随连接一起丢失, 不计入回退判断
+        if r['lost'] and r['scenario'] != 'storm':
+            failed.append(f'{r["scenario"]}: 丢失 {r["lost"]} 条')
+        if args.max_p99_ms and r['p99_ms'] > args.max_p99_ms:
+            failed.append(f'{r["scenario"]}: p99 {r["p99_ms"]:.1f}ms')
+        if args.min_rate and r['rate'] < args.min_rate:
+            failed.append(f'{r["scenario"]}: 吞吐 {r["rate"]:.1f}条/s')
+    if failed:
+        print('性能回退: ' + '; '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
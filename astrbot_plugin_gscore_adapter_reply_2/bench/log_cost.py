@@ -0,0 +1,91 @@
+'''
+消息热路径日志的开销
+
+    python bench/log_cost.py [--msgs 500] [--image-kb 512]
+
+每条消息记录收到的消息链与即将发送的回复(各含一张base64图片), 输出写入/dev/null:
+- legacy: 原先的`logger.info(message_chain)`与f-string日志
+- hot: HotLogger, 附件只记录长度与摘要
+- hot 10%: HotLogger, 两类日志均按10%采样
+并分别在INFO与WARNING级别下运行, 后者对应日志关闭的情况;
+需在装有AstrBot的环境中运行
+'''
+
+import argparse
+import logging
+import os
+import time
+from base64 import b64encode
+
+from astrbot.api.event import MessageChain
+from astrbot.core.message.components import Image, Plain
+
+from _plugin import load
+
+logs = load('logs')
+
+
+class CountingStream:
+    def __init__(self):
+        self.bytes = 0
+        self.sink = open(os.devnull, 'w', encoding='utf-8')
+
+    def write(self, s: str):
+        self.bytes += len(s)
+        self.sink.write(s)
+
+    def flush(self):
+        pass
+
+
+def legacy(logger, chain, reply):
+    logger.info(chain)
+    logger.info(f'【即将发送】[gsuid-core]: {reply}')
+
+
+def hot(log, chain, reply):
+    log.info('event', '%s', chain)
+    log.info('deliver', '【即将发送】[gsuid-core]: %s', reply)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--msgs', type=int, default=500)
+    parser.add_argument('--image-kb', type=int, default=512)
+    args = parser.parse_args()
+
+    image = b64encode(os.urandom(args.image_kb * 1024)).decode()
+    chain = [Plain('ys查询面板'), Image.fromBase64(image)]
+    reply = MessageChain()
+    reply.chain.extend([Plain('面板如下'), Image.fromBase64(image)])
+
+    for level in (logging.INFO, logging.WARNING):
+        logger = logging.getLogger(f'bench.{level}')
+        logger.propagate = False
+        logger.setLevel(level)
+        stream = CountingStream()
+        logger.addHandler(logging.StreamHandler(stream))  # type: ignore
+        cases = (
+            ('legacy', lambda: legacy(logger, chain, reply)),
+            ('hot', lambda: hot(logs.HotLogger(logger), chain, reply)),
+            (
+                'hot 10%',
+                lambda: hot(
+                    logs.HotLogger(logger, {'event': 0.1, 'deliver': 0.1}), chain, reply
+                ),
+            ),
+        )
+        for name, func in cases:
+            stream.bytes = 0
+            t = time.perf_counter()
+            for _ in range(args.msgs):
+                func()
+            cost = (time.perf_counter() - t) / args.msgs * 1e6
+            print(
+                f'{logging.getLevelName(level):<7} {name:<8} '
+                f'{cost:9.1f}µs/条  日志 {stream.bytes / args.msgs / 1024:8.2f}KB/条'
+            )
+
+
+if __name__ == '__main__':
+    main()
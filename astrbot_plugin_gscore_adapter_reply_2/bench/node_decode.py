@@ -0,0 +1,96 @@
+'''
+合并转发(node)消息的解码开销
+
+    python bench/node_decode.py [--nodes 50] [--images 20]
+
+对比旧实现(content解码为Any, 再对每个节点`Message(**dict)`重建)与
+带标签联合类型的一次性解码, 报告每条消息的耗时;
+两者耗时相当(含图片时主要开销在复制base64字符串), 用于确认类型化解码没有带来回退
+'''
+
+import argparse
+import timeit
+from base64 import b64encode
+from typing import Any, List, Optional
+
+from msgspec import Struct
+from msgspec import json as msgjson
+
+from _plugin import load
+
+models = load('models')
+
+
+class LegacyMessage(Struct):
+    type: Optional[str] = None
+    data: Optional[Any] = None
+
+
+class LegacyMessageSend(Struct):
+    bot_id: str = 'Bot'
+    bot_self_id: str = ''
+    msg_id: str = ''
+    target_type: Optional[str] = None
+    target_id: Optional[str] = ''
+    content: Optional[List[LegacyMessage]] = None
+
+
+def build_payload(nodes: int, images: int) -> bytes:
+    image = f'base64://{b64encode(b"x" * 30 * 1024).decode()}'
+    data = []
+    for i in range(nodes):
+        if i < images:
+            data.append({'type': 'image', 'data': image})
+        else:
+            data.append({'type': 'text', 'data': f'第{i}抽: 五星角色 ' * 10})
+    return msgjson.encode(
+        {
+            'bot_id': 'onebot',
+            'target_type': 'group',
+            'target_id': '1',
+            'content': [
+                {'type': 'text', 'data': '抽卡记录'},
+                {'type': 'node', 'data': data},
+            ],
+        }
+    )
+
+
+def _walk_legacy(content):
+    # 旧实现在_to_msg中对每个节点重建Message并递归
+    for c in content:
+        if c.type == 'node':
+            _walk_legacy([LegacyMessage(**n) for n in c.data])
+
+
+def _walk_typed(content):
+    for c in content:
+        if isinstance(c, models.NodeSegment):
+            _walk_typed(c.data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=50)
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    payload = build_payload(args.nodes, args.images)
+    legacy = msgjson.Decoder(LegacyMessageSend)
+    typed = msgjson.Decoder(models.MessageSend)
+
+    def run_legacy():
+        _walk_legacy(legacy.decode(payload).content)
+
+    def run_typed():
+        _walk_typed(typed.decode(payload).content)
+
+    print(f'{args.nodes}个节点({args.images}张图片), 消息大小 {len(payload) / 1024:.1f}KB')
+    for name, func in (('legacy', run_legacy), ('typed', run_typed)):
+        cost = min(timeit.repeat(func, number=args.number, repeat=5)) / args.number
+        print(f'{name:<8} {cost * 1e6:8.1f}us/条')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+'''
+发送路径序列化的内存分配
+
+    python bench/serialize_alloc.py [--msgs 2000] [--image-kb 200]
+
+- encode: 每条消息编码为新的bytes(旧的发送路径)
+- encode_into: 编码到复用的bytearray(CoreConnection当前的做法)
+用tracemalloc记录每条消息编码期间新分配的内存峰值, 以及平均耗时;
+缓冲区预热后, encode_into每条消息不再分配与消息等长的新对象
+'''
+
+import argparse
+import os
+import time
+import tracemalloc
+from base64 import b64encode
+
+from _plugin import load
+
+codec = load('codec')
+models = load('models')
+
+
+def build(image_kb: int):
+    content = [models.Message(type='text', data='ys今日素材')]
+    if image_kb:
+        image = f'base64://{b64encode(os.urandom(image_kb * 1024)).decode()}'
+        content.append(models.Message(type='image', data=image))
+    return models.MessageReceive(
+        bot_id='onebot',
+        bot_self_id='10000',
+        msg_id='123456',
+        user_type='group',
+        group_id='654321',
+        user_id='123456',
+        sender={'nickname': '用户', 'avatar': 'https://q1.qlogo.cn/g?b=qq&nk=1&s=640'},
+        content=content,
+    )
+
+
+def run(name, func, msg, msgs: int):
+    func(msg)
+    tracemalloc.start()
+    transient = 0
+    for _ in range(msgs):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func(msg)
+        transient += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    t = time.perf_counter()
+    for _ in range(msgs):
+        func(msg)
+    cost = (time.perf_counter() - t) / msgs * 1e6
+    print(f'{name:<14} 每条新分配 {transient / msgs / 1024:9.1f}KB  耗时 {cost:8.1f}µs')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--msgs', type=int, default=2000)
+    parser.add_argument('--image-kb', type=int, default=200)
+    args = parser.parse_args()
+
+    for image_kb in (0, args.image_kb):
+        msg = build(image_kb)
+        print(f'消息大小 {len(codec.encode(msg, False)) / 1024:.1f}KB')
+        for binary in (False, True):
+            fmt = 'msgpack' if binary else 'json'
+            buf = bytearray()
+            run(f'{fmt} encode', lambda m: codec.encode(m, binary), msg, args.msgs)
+            run(
+                f'{fmt} into',
+                lambda m: codec.encode_into(m, buf, binary),
+                msg,
+                args.msgs,
+            )
+
+
+if __name__ == '__main__':
+    main()
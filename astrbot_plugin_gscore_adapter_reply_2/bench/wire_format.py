@@ -0,0 +1,84 @@
+'''
+JSON与msgpack传输格式的往返对比
+
+    python bench/wire_format.py [--rounds 50] [--images 4] [--image-kb 300]
+
+通过本地模拟Core, 测量每次往返(发送带图片的消息并收到带图片的回复)的
+线上字节数、耗时与CPU时间; 需在装有AstrBot的环境中运行
+'''
+
+import argparse
+import asyncio
+import os
+import time
+from base64 import b64encode
+from functools import partial
+
+from _plugin import load
+from fake_core import FakeCore, make_reply
+
+CoreConnection = load('connection').CoreConnection
+models = load('models')
+
+
+def build_message(images, binary: bool):
+    content = [models.Message(type='text', data='查询面板')]
+    for raw in images:
+        if binary:
+            data = models.RawPayload(raw)
+        else:
+            # 与适配器一致, JSON模式下base64在编码阶段完成, 计入CPU
+            data = f'base64://{b64encode(raw).decode()}'
+        content.append(models.Message(type='image', data=data))
+    return models.MessageReceive(
+        bot_id='onebot', user_id='10001', group_id='20002', content=content
+    )
+
+
+async def run(fmt: str, rounds: int, images: int, image_kb: int):
+    core = FakeCore(
+        reply=partial(make_reply, image_count=images, image_size=image_kb * 1024)
+    )
+    url = await core.start()
+    replies: asyncio.Queue = asyncio.Queue()
+
+    async def on_message(msg):
+        await replies.put(msg)
+
+    conn = CoreConnection(url, on_message, wire_format=fmt)
+    conn.start()
+    await conn.wait_ready()
+
+    payloads = [os.urandom(image_kb * 1024) for _ in range(images)]
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    for _ in range(rounds):
+        await conn.try_send(build_message(payloads, conn.binary))
+        await replies.get()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+
+    print(
+        f'{fmt:<8} 协商结果 {"msgpack" if conn.binary else "json":<8}'
+        f'上行 {core.bytes_in / rounds / 1024:8.1f}KB  '
+        f'下行 {core.bytes_out / rounds / 1024:8.1f}KB  '
+        f'往返 {wall / rounds * 1000:6.2f}ms  '
+        f'CPU {cpu / rounds * 1000:6.2f}ms'
+    )
+    await conn.stop()
+    await core.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--images', type=int, default=4)
+    parser.add_argument('--image-kb', type=int, default=300)
+    args = parser.parse_args()
+    print('(CPU为适配器与模拟Core合计, 两者在同一进程中)')
+    for fmt in ('json', 'msgpack'):
+        asyncio.run(run(fmt, args.rounds, args.images, args.image_kb))
+
+
+if __name__ == '__main__':
+    main()
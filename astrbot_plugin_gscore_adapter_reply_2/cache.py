@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Optional, Sized, TypeVar
+
+V = TypeVar('V', bound=Sized)
+
+
+class LRUBytesCache(Generic[V]):
+    '''
+    按字节预算淘汰的LRU缓存
+
+    值的大小按len()计算, 超出预算时从最久未使用的条目开始淘汰;
+    单个超过预算的值直接不缓存
+    '''
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: 'OrderedDict[Hashable, V]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: V):
+        cost = len(value)
+        if cost > self.max_bytes:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._data[key] = value
+        self.size += cost
+        while self.size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._data),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
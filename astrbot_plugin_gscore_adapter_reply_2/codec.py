@@ -0,0 +1,142 @@
+from base64 import b64encode
+from typing import Any, List, Union
+
+from astrbot.api import logger
+from msgspec import Raw, ValidationError
+from msgspec import json as msgjson
+from msgspec import msgpack
+
+from .models import (
+    LOG_SEGMENTS,
+    MessageReceive,
+    MessageSend,
+    NodeSegment,
+    RawFile,
+    RawMessageSend,
+    RawSegment,
+    RawPayload,
+    SendSegment,
+)
+
+# 通过websocket子协议协商, 不支持的Core不会回应该子协议, 自动退回JSON
+MSGPACK_SUBPROTOCOL = 'gscore-msgpack'
+
+
+def _json_hook(obj: Any) -> Any:
+    if isinstance(obj, RawPayload):
+        return f'base64://{b64encode(obj).decode("ascii")}'
+    if isinstance(obj, RawFile):
+        return f'{obj.name}|{b64encode(obj).decode("ascii")}'
+    raise NotImplementedError(type(obj))
+
+
+def _msgpack_hook(obj: Any) -> Any:
+    if isinstance(obj, RawPayload):
+        return memoryview(obj)
+    if isinstance(obj, RawFile):
+        return [obj.name, memoryview(obj)]
+    raise NotImplementedError(type(obj))
+
+
+_json_encoder = msgjson.Encoder(enc_hook=_json_hook)
+_msgpack_encoder = msgpack.Encoder(enc_hook=_msgpack_hook)
+
+# (整条消息, 退路, 单个消息段, 原始消息段, node的子消息段, 任意内容)
+_json_decoders = (
+    msgjson.Decoder(MessageSend),
+    msgjson.Decoder(RawMessageSend),
+    msgjson.Decoder(SendSegment),
+    msgjson.Decoder(RawSegment),
+    msgjson.Decoder(List[Raw]),
+    msgjson.Decoder(),
+)
+_msgpack_decoders = (
+    msgpack.Decoder(MessageSend),
+    msgpack.Decoder(RawMessageSend),
+    msgpack.Decoder(SendSegment),
+    msgpack.Decoder(RawSegment),
+    msgpack.Decoder(List[Raw]),
+    msgpack.Decoder(),
+)
+_receive_decoder = msgpack.Decoder(MessageReceive)
+
+
+def encode(msg: MessageReceive, binary: bool) -> bytes:
+    if binary:
+        return _msgpack_encoder.encode(msg)
+    return _json_encoder.encode(msg)
+
+
+def encode_into(msg: MessageReceive, buf: bytearray, binary: bool):
+    '''编码到复用的缓冲区, 编码后缓冲区的长度即为消息长度'''
+    if binary:
+        _msgpack_encoder.encode_into(msg, buf)
+    else:
+        _json_encoder.encode_into(msg, buf)
+
+
+def decode(data: Union[str, bytes], binary: bool) -> MessageSend:
+    decoders = _msgpack_decoders if binary else _json_decoders
+    try:
+        return decoders[0].decode(data)
+    except ValidationError:
+        pass
+
+    # 含有未知类型的消息段, 逐段解码并跳过无法识别的部分
+    raw = decoders[1].decode(data)
+    return MessageSend(
+        bot_id=raw.bot_id,
+        bot_self_id=raw.bot_self_id,
+        msg_id=raw.msg_id,
+        target_type=raw.target_type,
+        target_id=raw.target_id,
+        content=_decode_segments(raw.content or [], decoders),
+    )
+
+
+def _decode_segments(items, decoders) -> list:
+    content = []
+    for item in items:
+        try:
+            content.append(decoders[2].decode(item))
+            continue
+        except ValidationError as e:
+            error = e
+        try:
+            seg = _decode_raw_segment(decoders[3].decode(item), decoders)
+        except ValidationError:
+            seg = None
+        if seg is not None:
+            content.append(seg)
+        else:
+            logger.debug(f'[GsCore] 跳过无法识别的消息段: {error}')
+    return content
+
+
+def _decode_raw_segment(raw: RawSegment, decoders):
+    if raw.type is None or not len(raw.data):
+        return None
+    # node整体校验失败时拆开逐个解码, 只跳过其中无法识别的子消息段
+    if raw.type == 'node':
+        return NodeSegment(data=_decode_segments(decoders[4].decode(raw.data), decoders))
+    # 与旧版一致, log消息段的标签不区分大小写
+    log_segment = LOG_SEGMENTS.get(raw.type.lower())
+    if log_segment is not None:
+        return log_segment(data=decoders[5].decode(raw.data))
+    return None
+
+
+def dump(msg: MessageReceive) -> bytes:
+    '''本地持久化统一使用msgpack, 与连接协商的格式无关'''
+    return _msgpack_encoder.encode(msg)
+
+
+def load(data: bytes) -> MessageReceive:
+    msg = _receive_decoder.decode(data)
+    # 还原附件的原始内容类型, 以便按发送时连接的格式重新编码
+    for item in msg.content:
+        if isinstance(item.data, bytes):
+            item.data = RawPayload(item.data)
+        elif item.type == 'file' and isinstance(item.data, list):
+            item.data = RawFile.create(*item.data)
+    return msg
@@ -0,0 +1,236 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+import websockets.client
+from astrbot.api import logger
+from websockets.exceptions import ConnectionClosed
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+
+from . import codec
+from .metrics import Metrics
+from .models import MessageReceive, MessageSend
+
+MessageHandler = Callable[[MessageSend], Awaitable[None]]
+
+# 发送缓冲区复用的上限, 偶尔的大附件消息发完后不长期占用内存
+BUFFER_KEEP = 1024 * 1024
+
+
+class CoreConnection:
+    '''
+    常驻的[gsuid-core]连接守护
+
+    由后台任务独占websocket: 断线后以指数退避+随机抖动无限重连,
+    心跳由后台任务按固定周期进行, 超时未回应时立即摘除连接并中断传输,
+    不等待关闭握手, 卡死的Core不会拖住发送方, 路由也能尽快切换;
+    其余协程只需等待`ready`即可, 不再需要每条消息都ping一次;
+    `wire_format`为msgpack时通过子协议协商二进制帧, Core不支持时退回JSON;
+    permessage-deflate压缩可关闭, 或调整压缩等级与窗口大小以换取CPU/内存
+    '''
+
+    def __init__(
+        self,
+        url: str,
+        on_message: MessageHandler,
+        ping_interval: float = 20,
+        ping_timeout: float = 20,
+        backoff_base: float = 1,
+        backoff_max: float = 60,
+        wire_format: str = 'json',
+        compression: bool = True,
+        compression_level: int = 6,
+        window_bits: int = 15,
+        max_size: int = 2**26,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.url = url
+        self.wire_format = wire_format
+        self.compression = compression
+        self.compression_level = compression_level
+        self.window_bits = min(15, max(9, window_bits))
+        self.max_size = max_size
+        self.on_message = on_message
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics
+
+        self.ws: Optional[websockets.client.WebSocketClientProtocol] = None
+        self.ready = asyncio.Event()
+        self.connected_at = 0.0
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        self._buf: Optional[bytearray] = bytearray()
+
+    @property
+    def is_connect(self) -> bool:
+        return self.ready.is_set()
+
+    @property
+    def binary(self) -> bool:
+        ws = self.ws
+        return ws is not None and ws.subprotocol == codec.MSGPACK_SUBPROTOCOL
+
+    @property
+    def uptime(self) -> float:
+        if not self.is_connect:
+            return 0
+        return time.monotonic() - self.connected_at
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        self._closing = True
+        self.ready.clear()
+        # 取消监督任务时其finally会清空self.ws, 需先取出再关闭
+        ws = self.ws
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        self.ws = None
+        if ws is not None:
+            await ws.close()
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def try_send(self, msg: MessageReceive) -> bool:
+        ws = self.ws
+        if ws is None or not self.ready.is_set():
+            return False
+        # 同一时刻只有一个发送方能取到缓冲区, 其余的临时新建
+        buf, self._buf = self._buf or bytearray(), None
+        codec.encode_into(msg, buf, self.binary)
+        size = len(buf)
+        try:
+            # websockets在组帧(掩码/压缩)时会复制数据, 返回后即可复用
+            await ws.send(buf)
+        except ConnectionClosed:
+            self._mark_down(ws)
+            return False
+        finally:
+            if size <= BUFFER_KEEP:
+                self._buf = buf
+        if self.metrics is not None:
+            self.metrics.sent(msg.msg_id, size)
+        return True
+
+    def _mark_down(self, ws):
+        if self.ws is ws:
+            self.ready.clear()
+
+    async def _heartbeat(self, ws):
+        if not self.ping_interval:
+            return
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                # 发送缓冲区已满时ping本身也会阻塞, 一并计入超时
+                await asyncio.wait_for(self._ping(ws), self.ping_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f'[GsCore] {self.url} 心跳超时, 判定为断线')
+                self._mark_down(ws)
+                # 中断传输: 阻塞中的发送立即失败, 接收循环随之结束并重连
+                ws.transport.abort()
+                return
+            except ConnectionClosed:
+                return
+
+    @staticmethod
+    async def _ping(ws):
+        await (await ws.ping())
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _extensions(self):
+        if not self.compression:
+            return None
+        # 窗口为15时沿用websockets默认的协商方式, 更小的窗口同时约束双方以限制内存
+        bits = self.window_bits if self.window_bits < 15 else None
+        return [
+            ClientPerMessageDeflateFactory(
+                server_max_window_bits=bits,
+                client_max_window_bits=bits or True,
+                compress_settings={
+                    'level': self.compression_level,
+                    'memLevel': 5,
+                },
+            )
+        ]
+
+    async def _connect(self):
+        return await websockets.client.connect(  # type: ignore
+            self.url,
+            max_size=self.max_size,
+            compression=None,
+            extensions=self._extensions(),
+            open_timeout=60,
+            # 心跳由_heartbeat负责
+            ping_interval=None,
+            subprotocols=(
+                [codec.MSGPACK_SUBPROTOCOL]  # type: ignore
+                if self.wire_format == 'msgpack'
+                else None
+            ),
+        )
+
+    async def _supervise(self):
+        attempt = 0
+        while not self._closing:
+            logger.info(f'连接至[gsuid-core]: {self.url}...')
+            try:
+                ws = await self._connect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delay = self._backoff(attempt)
+                attempt += 1
+                logger.warning(
+                    f'[链接错误] Core服务器连接失败: {e!r}, '
+                    f'{delay:.1f}秒后重试...请确认是否根据文档安装【早柚核心】！'
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            attempt = 0
+            self.ws = ws
+            self.connected_at = time.monotonic()
+            self.ready.set()
+            logger.info(
+                f'与[gsuid-core]成功连接! {self.url} '
+                f'({"msgpack" if self.binary else "json"})'
+            )
+            heartbeat = asyncio.create_task(self._heartbeat(ws))
+            try:
+                async for message in ws:
+                    if self.metrics is not None:
+                        self.metrics.received(len(message))
+                    try:
+                        await self.on_message(codec.decode(message, self.binary))
+                    except Exception as e:
+                        logger.exception(e)
+            except ConnectionClosed:
+                pass
+            finally:
+                heartbeat.cancel()
+                self._mark_down(ws)
+                self.ws = None
+
+            if not self._closing:
+                logger.warning(f'与[gsuid-core]断开连接! {self.url}')
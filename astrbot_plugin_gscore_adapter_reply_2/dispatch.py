@@ -0,0 +1,63 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Set
+
+from astrbot.api import logger
+
+Job = Callable[[], Awaitable[None]]
+
+
+class SessionDispatcher:
+    '''
+    按会话分道并发处理[gsuid-core]的回复
+
+    同一会话内的任务按提交顺序串行执行, 不同会话之间并行,
+    全局并发数由`max_concurrency`限制;
+    会话空闲后其工作协程自动退出, 不会随会话数量无限增长
+    '''
+
+    def __init__(self, max_concurrency: int = 16):
+        self._sem = asyncio.Semaphore(max(1, max_concurrency))
+        self._lanes: Dict[Hashable, Deque[Job]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.active = 0
+
+    def submit(self, key: Hashable, job: Job):
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append(job)
+            return
+
+        self._lanes[key] = deque([job])
+        task = asyncio.create_task(self._run(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable):
+        lane = self._lanes[key]
+        try:
+            while lane:
+                job = lane.popleft()
+                async with self._sem:
+                    self.active += 1
+                    try:
+                        await job()
+                    except Exception as e:
+                        logger.exception(e)
+                    finally:
+                        self.active -= 1
+        finally:
+            self._lanes.pop(key, None)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._lanes.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'sessions': len(self._lanes),
+            'pending': sum(len(lane) for lane in self._lanes.values()),
+            'active': self.active,
+        }
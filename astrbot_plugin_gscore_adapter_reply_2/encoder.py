@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import os
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from .cache import LRUBytesCache
+from .imaging import ImageShrinker
+from .models import RawFile, RawPayload
+
+# 3的倍数, 分块编码结果可直接拼接; 分块也让出GIL, 避免长时间卡住事件循环线程
+CHUNK_SIZE = 3 * 64 * 1024
+
+
+def _read_b64(path: Union[str, Path]) -> str:
+    parts = []
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            parts.append(b64encode(chunk))
+    return b''.join(parts).decode('ascii')
+
+
+def _read_digest(path: Union[str, Path]) -> Tuple[bytes, bytes]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, hashlib.sha256(data).digest()
+
+
+def _b64(data: bytes) -> str:
+    return b64encode(data).decode('ascii')
+
+
+def _read_raw(path: Union[str, Path], name: Optional[str]) -> bytes:
+    with open(path, 'rb') as f:
+        data = f.read()
+    if name is not None:
+        return RawFile.create(name, data)
+    return RawPayload(data)
+
+
+class AttachmentEncoder:
+    '''
+    图片/文件的读取与编码
+
+    在有界线程池中完成, 避免大附件阻塞事件循环;
+    同时按文件大小限制正在编码的总字节数, 防止并发的大文件撑爆内存;
+    编码结果以(路径, mtime, 大小)为键缓存, 重复发送同一附件只需一次查表;
+    配置了`shrinker`时图片先缩放/重新编码, 最终结果同样以(路径, mtime, 大小)为键缓存,
+    缩放结果另按内容哈希缓存
+    '''
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_inflight_bytes: int = 64 * 1024 * 1024,
+        cache_bytes: int = 64 * 1024 * 1024,
+        shrinker: Optional[ImageShrinker] = None,
+    ):
+        self.cache: Optional[LRUBytesCache[Union[str, bytes]]] = (
+            LRUBytesCache(cache_bytes) if cache_bytes > 0 else None
+        )
+        self.max_inflight_bytes = max(1, max_inflight_bytes)
+        self.shrinker = shrinker
+        self.shrunk = 0
+        self.shrink_saved = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix='gscore-encode',
+        )
+        self._inflight = 0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def _reserve(self, size: int):
+        # 超过上限的单个文件独占全部额度, 而不是永远等待
+        cost = min(size, self.max_inflight_bytes)
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: self._inflight + cost <= self.max_inflight_bytes
+            )
+            self._inflight += cost
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._inflight -= cost
+                self._cond.notify_all()
+
+    async def encode_file(
+        self,
+        path: Union[str, Path],
+        binary: bool = False,
+        name: Optional[str] = None,
+    ) -> Union[str, bytes]:
+        '''
+        binary为False时返回base64字符串;
+        为True时返回原始内容(RawPayload, 给出name时为RawFile), 由msgpack直接发送
+        '''
+        st = os.stat(path)
+        key = (os.fspath(path), st.st_mtime_ns, st.st_size, binary, name)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        async with self._reserve(st.st_size):
+            loop = asyncio.get_running_loop()
+            if binary:
+                data = await loop.run_in_executor(
+                    self._executor, _read_raw, path, name
+                )
+            else:
+                data = await loop.run_in_executor(self._executor, _read_b64, path)
+
+        if self.cache is not None:
+            self.cache.put(key, data)
+        return data
+
+    async def encode_image(
+        self,
+        path: Union[str, Path],
+        binary: bool = False,
+    ) -> Union[str, bytes]:
+        shrinker = self.shrinker
+        st = os.stat(path)
+        if shrinker is None or st.st_size < shrinker.min_bytes:
+            return await self.encode_file(path, binary)
+
+        # 命中时直接返回最终结果, 不再读取文件、计算哈希与编码
+        path_key = (
+            'image', os.fspath(path), st.st_mtime_ns, st.st_size, binary, shrinker.key
+        )
+        if self.cache is not None:
+            cached = self.cache.get(path_key)
+            if cached is not None:
+                return cached
+
+        loop = asyncio.get_running_loop()
+        async with self._reserve(st.st_size):
+            data, digest = await loop.run_in_executor(
+                self._executor, _read_digest, path
+            )
+            # 同一张图片经平台下载到不同的临时路径时, 按内容只处理一次
+            key = ('shrink', digest, shrinker.key)
+            shrunk = self.cache.get(key) if self.cache is not None else None
+            if shrunk is None:
+                shrunk = (
+                    await loop.run_in_executor(self._executor, shrinker.shrink, data)
+                    or b''
+                )
+                if shrunk:
+                    self.shrunk += 1
+                    self.shrink_saved += len(data) - len(shrunk)
+                # 空值表示无需处理, 同样缓存以免重复尝试
+                if self.cache is not None:
+                    self.cache.put(key, shrunk)
+            payload = shrunk or data
+            if binary:
+                result = RawPayload(payload)
+            else:
+                result = await loop.run_in_executor(self._executor, _b64, payload)
+
+        if self.cache is not None:
+            self.cache.put(path_key, result)
+        return result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
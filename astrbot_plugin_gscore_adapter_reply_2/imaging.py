@@ -0,0 +1,76 @@
+from io import BytesIO
+from typing import Literal, Optional, Tuple
+
+try:
+    from PIL import Image as PILImage
+    from PIL import ImageOps
+except ImportError:
+    PILImage = None
+
+ShrinkFormat = Literal['jpeg', 'webp']
+
+
+class ImageShrinker:
+    '''
+    上传给Core前的图片缩放与重新编码
+
+    手机截图动辄数MB的PNG, Core做识别只需要其中一小部分像素;
+    超过`min_bytes`的图片按最长边`max_side`等比缩小, 再以`quality`编码为JPEG/WebP;
+    动图、解码失败或处理后反而更大的图片保持原样;
+    在编码线程池中调用, Pillow解码/缩放/编码期间会释放GIL
+    '''
+
+    def __init__(
+        self,
+        max_side: int = 2048,
+        fmt: ShrinkFormat = 'jpeg',
+        quality: int = 85,
+        min_bytes: int = 512 * 1024,
+    ):
+        self.max_side = max(1, max_side)
+        self.fmt = 'WEBP' if fmt == 'webp' else 'JPEG'
+        self.quality = min(100, max(1, quality))
+        self.min_bytes = min_bytes
+
+    @property
+    def key(self) -> Tuple:
+        '''参数变化后缓存失效'''
+        return (self.max_side, self.fmt, self.quality)
+
+    def shrink(self, data: bytes) -> Optional[bytes]:
+        '''返回处理后的图片, 无需处理时返回None'''
+        if PILImage is None or len(data) < self.min_bytes:
+            return None
+        try:
+            with PILImage.open(BytesIO(data)) as img:
+                if getattr(img, 'is_animated', False):
+                    return None
+                # JPEG可在解码时直接按比例缩小, 省去大部分解码开销
+                img.draft('RGB', (self.max_side, self.max_side))
+                img = ImageOps.exif_transpose(img)
+                if max(img.size) > self.max_side:
+                    img.thumbnail(
+                        (self.max_side, self.max_side), PILImage.Resampling.LANCZOS
+                    )
+                img = self._convert(img)
+                out = BytesIO()
+                img.save(out, self.fmt, quality=self.quality)
+        except Exception:
+            return None
+        result = out.getvalue()
+        return result if len(result) < len(data) else None
+
+    def _convert(self, img):
+        if self.fmt == 'WEBP':
+            if img.mode not in ('RGB', 'RGBA'):
+                return img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+            return img
+        if img.mode in ('RGB', 'L'):
+            return img
+        if 'A' in img.getbands() or 'transparency' in img.info:
+            # JPEG不支持透明, 铺白底而不是让透明区域变黑
+            rgba = img.convert('RGBA')
+            background = PILImage.new('RGB', rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            return background
+        return img.convert('RGB')
@@ -0,0 +1,84 @@
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class RequestLimiter:
+    '''
+    转发前的按用户限流与重复指令合并
+
+    - 合并: 同一用户在`coalesce_window`秒内发送的相同内容(文本+附件)只转发第一条,
+      连续刷屏的重型指令(如刷新面板)不会让Core重复渲染同一张图
+    - 限流: 每个用户一个令牌桶, 每分钟补充`rate_per_minute`个令牌, 最多积攒`burst`个,
+      令牌耗尽的消息直接丢弃
+    两者均为0时关闭; 被拦下的消息不会读取和编码其中的附件
+    '''
+
+    def __init__(
+        self,
+        rate_per_minute: float = 0,
+        burst: int = 5,
+        coalesce_window: float = 0,
+    ):
+        self.rate = rate_per_minute / 60
+        self.burst = max(1, burst)
+        self.coalesce_window = coalesce_window
+        self.passed = 0
+        self.coalesced = 0
+        self.limited = 0
+        # 用户 -> (令牌数, 上次补充时间)
+        self._buckets: Dict[Hashable, Tuple[float, float]] = {}
+        # 用户 -> (内容签名, 转发时间)
+        self._last: Dict[Hashable, Tuple[Hashable, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 or self.coalesce_window > 0
+
+    def check(self, key: Hashable, signature: Hashable) -> Optional[str]:
+        '''放行时返回None, 否则返回拦下的原因'''
+        now = time.monotonic()
+        if self.coalesce_window > 0:
+            last = self._last.get(key)
+            if (
+                last is not None
+                and last[0] == signature
+                and now - last[1] <= self.coalesce_window
+            ):
+                self.coalesced += 1
+                return 'coalesced'
+
+        if self.rate > 0:
+            tokens, ts = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - ts) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.limited += 1
+                return 'limited'
+            self._buckets[key] = (tokens - 1, now)
+
+        if self.coalesce_window > 0:
+            self._last[key] = (signature, now)
+        self.passed += 1
+        self._prune(now)
+        return None
+
+    def _prune(self, now: float):
+        if len(self._last) > 10000:
+            self._last = {
+                k: v
+                for k, v in self._last.items()
+                if now - v[1] <= self.coalesce_window
+            }
+        if len(self._buckets) > 10000:
+            # 令牌已补满的用户与新用户等价, 无需保留
+            refill = self.burst / self.rate
+            self._buckets = {
+                k: v for k, v in self._buckets.items() if now - v[1] < refill
+            }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'passed': self.passed,
+            'coalesced': self.coalesced,
+            'limited': self.limited,
+        }
@@ -0,0 +1,139 @@
+import logging
+import random
+import zlib
+from typing import Any, Dict, Optional
+
+# 不带`base64://`前缀时, 超过该长度且形似base64的字符串才视为附件内容
+_B64_MIN = 1024
+_B64_CHARS = frozenset(
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=-_'
+)
+# 摘要只对开头的部分计算crc32, 大附件也不会拖慢日志
+_DIGEST_BYTES = 64 * 1024
+_MAX_ITEMS = 20
+
+
+def _digest(data) -> str:
+    return f'{zlib.crc32(data[:_DIGEST_BYTES]) & 0xFFFFFFFF:08x}'
+
+
+def _is_base64(s: str) -> bool:
+    return len(s) >= _B64_MIN and _B64_CHARS.issuperset(s[:64])
+
+
+def summarize(obj: Any, max_len: int = 200) -> str:
+    '''
+    日志用的简短表示
+
+    二进制与base64内容只保留长度和摘要, 长字符串截断,
+    消息链、消息组件与msgspec结构体逐字段展开
+    '''
+    if isinstance(obj, str):
+        prefixed = obj.startswith('base64://')
+        body = obj[9:] if prefixed else obj
+        if prefixed or _is_base64(body):
+            head = body[:_DIGEST_BYTES].encode('ascii', 'ignore')
+            return f'<base64 {len(body)}B #{_digest(head)}>'
+        if len(obj) > max_len:
+            return f'{obj[:max_len]!r}…(+{len(obj) - max_len})'
+        return repr(obj)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return f'<bytes {len(obj)}B #{_digest(obj)}>'
+    if isinstance(obj, (list, tuple)):
+        items = [summarize(x, max_len) for x in obj[:_MAX_ITEMS]]
+        if len(obj) > _MAX_ITEMS:
+            items.append(f'…(+{len(obj) - _MAX_ITEMS})')
+        return f'[{", ".join(items)}]'
+    if isinstance(obj, dict):
+        return (
+            '{'
+            + ', '.join(f'{k}: {summarize(v, max_len)}' for k, v in obj.items())
+            + '}'
+        )
+    chain = getattr(obj, 'chain', None)
+    if isinstance(chain, list) and type(obj).__name__ == 'MessageChain':
+        return f'MessageChain{summarize(chain, max_len)}'
+
+    fields = getattr(obj, '__struct_fields__', None)
+    if fields is not None:
+        values = ((f, getattr(obj, f)) for f in fields)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        values = vars(obj).items()
+    else:
+        text = str(obj)
+        return text if len(text) <= max_len else f'{text[:max_len]}…(+{len(text) - max_len})'
+    return (
+        f'{type(obj).__name__}('
+        + ', '.join(
+            f'{k}={summarize(v, max_len)}'
+            for k, v in values
+            if v not in (None, '', [], {})
+        )
+        + ')'
+    )
+
+
+def parse_sample(spec: str) -> Dict[str, float]:
+    '''`event=1,reply=0.1`形式的各类日志采样率'''
+    sample = {}
+    for part in spec.split(','):
+        if '=' not in part:
+            continue
+        key, _, value = part.partition('=')
+        try:
+            sample[key.strip()] = max(0.0, min(1.0, float(value)))
+        except ValueError:
+            continue
+    return sample
+
+
+class HotLogger:
+    '''
+    消息热路径上的日志
+
+    日志级别未开启或未被采样时直接返回, 不做任何格式化;
+    参数经`summarize`处理, 附件内容只记录长度与摘要;
+    `sample`为各类日志的采样率, 未列出的类别全部记录
+    '''
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        sample: Optional[Dict[str, float]] = None,
+        max_len: int = 200,
+    ):
+        self.logger = logger
+        self.sample = sample or {}
+        self.max_len = max_len
+        self.skipped = 0
+
+    def debug(self, category: str, msg: str, *args: Any):
+        self._log(logging.DEBUG, category, msg, args)
+
+    def info(self, category: str, msg: str, *args: Any):
+        self._log(logging.INFO, category, msg, args)
+
+    def _log(self, level: int, category: str, msg: str, args: tuple):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = self.sample.get(category)
+        if rate is not None and rate < 1 and random.random() >= rate:
+            self.skipped += 1
+            return
+        # stacklevel指向调用info/debug的位置, 而不是本模块
+        self.logger.log(
+            level,
+            msg,
+            *(self._arg(a) for a in args),
+            stacklevel=3,
+        )
+
+    def _arg(self, arg: Any) -> Any:
+        # 普通的短字符串与数字原样输出, 不加引号
+        if isinstance(arg, (int, float)) or (
+            isinstance(arg, str)
+            and len(arg) <= self.max_len
+            and not arg.startswith('base64://')
+        ):
+            return arg
+        return summarize(arg, self.max_len)
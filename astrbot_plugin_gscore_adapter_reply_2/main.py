@@ -1,12 +1,20 @@
 import asyncio
-import base64
 import os
-from base64 import b64encode
+import tempfile
+import uuid
 from pathlib import Path
-from typing import List
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
-import aiofiles
-import websockets.client
 from astrbot.api import AstrBotConfig, logger
 from astrbot.api.event import AstrMessageEvent, MessageChain, filter
 from astrbot.api.star import Context, Star, register
@@ -23,13 +31,45 @@ from astrbot.core.message.components import (
 from astrbot.core.platform.astr_message_event import MessageSesion
 from astrbot.core.platform.message_type import MessageType
 from astrbot.core.star.filter.event_message_type import EventMessageType
-from msgspec import json as msgjson
-from websockets.exceptions import ConnectionClosed, ConnectionClosedError
 
+from .connection import CoreConnection
+from .dispatch import SessionDispatcher
+from .encoder import AttachmentEncoder
+from .imaging import PILImage, ImageShrinker
+from .limiter import RequestLimiter
+from .logs import HotLogger, parse_sample
+from .metrics import Metrics, Trace
 from .models import Message as GsMessage
-from .models import MessageReceive, MessageSend
+from .models import (
+    AtSegment,
+    FileSegment,
+    ImageSegment,
+    LogSegment,
+    MessageReceive,
+    MessageSend,
+    NodeSegment,
+    SendSegment,
+    TextSegment,
+)
+from .outbound import OutboundQueue
+from .outbox import DurableOutbox
+from .prefilter import CommandPrefilter
+from .router import CoreRouter, build_url
+from .spool import FileSpool, base64_head, image_suffix
+
+Converter = Callable[[BaseMessageComponent, List[GsMessage]], Awaitable[None]]
+
+# 头像地址模板, {self_id}在首次见到该平台时填入, {user_id}按消息填入
+AVATARS = {
+    'qq_official': 'https://q.qlogo.cn/qqapp/{self_id}/{user_id}/100',
+    'aiocqhttp': 'https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640',
+}
 
-gsconnecting = False
+
+class PlatformInfo(NamedTuple):
+    bot_id: str
+    bot_self_id: str
+    avatar: str
 
 
 @register(
@@ -43,319 +83,509 @@ class GsCoreAdapter(Star):
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.config = config
-        self.is_connect = False
         self.BOT_ID = self.config.BOT_ID
         self.IP = self.config.IP
         self.PORT = self.config.PORT
-
-    async def async_connect(
-        self,
-    ):
-        self.is_alive = True
-        self.ws_url = f'ws://{self.IP}:{self.PORT}/ws/{self.BOT_ID}'
-        logger.info(f'Bot_ID: {self.BOT_ID}连接至[gsuid-core]: {self.ws_url}...')
-        self.ws = await websockets.client.connect(  # type: ignore
-            self.ws_url, max_size=2**26, open_timeout=60, ping_timeout=60
+        # 配置了多个Core时按用户分片, 否则只连接IP:PORT
+        self.metrics = Metrics()
+        self.log = HotLogger(
+            logger,
+            parse_sample(self.config.get('log_sample', '')),
+            max_len=self.config.get('log_max_len', 200),
+        )
+        endpoints = self.config.get('CORES') or [f'{self.IP}:{self.PORT}']
+        self.shard_by = self.config.get('shard_by', 'user')
+        standbys = self.config.get('STANDBY_CORES') or []
+        # 有可切换的实例时缩短心跳, 尽快发现卡死但TCP未断开的Core
+        failover = bool(standbys) or len(endpoints) > 1
+        self.router = CoreRouter(
+            [self._connection(build_url(e, self.BOT_ID), failover) for e in endpoints],
+            [self._connection(build_url(e, self.BOT_ID), failover) for e in standbys],
+            failback_delay=self.config.get('failback_delay', 10),
+        )
+        shrinker = None
+        if self.config.get('image_shrink', False):
+            if PILImage is None:
+                logger.warning('[GsCore] 已开启image_shrink但未安装Pillow(见requirements.txt), 图片将原样发送')
+            else:
+                shrinker = ImageShrinker(
+                    max_side=self.config.get('image_max_side', 2048),
+                    fmt=self.config.get('image_format', 'jpeg'),
+                    quality=self.config.get('image_quality', 85),
+                    min_bytes=self.config.get('image_shrink_min_kb', 512) * 1024,
+                )
+        self.encoder = AttachmentEncoder(
+            max_workers=self.config.get('encode_workers', 2),
+            max_inflight_bytes=self.config.get('encode_max_inflight_mb', 64)
+            * 1024
+            * 1024,
+            cache_bytes=self.config.get('encode_cache_mb', 64) * 1024 * 1024,
+            shrinker=shrinker,
+        )
+        self.spool = FileSpool(
+            self.config.get('spool_dir')
+            or Path(tempfile.gettempdir()) / 'gscore_adapter' / 'spool',
+            ttl=self.config.get('spool_ttl', 3600),
+            quota_bytes=self.config.get('spool_quota_mb', 512) * 1024 * 1024,
+        )
+        # 超过该大小的图片直接解码到磁盘, 以文件形式交给平台发送
+        self.spill_bytes = self.config.get('image_spill_kb', 0) * 1024
+        self.dispatcher = SessionDispatcher(
+            max_concurrency=self.config.get('send_concurrency', 16),
         )
-        logger.info(f'与[gsuid-core]成功连接! Bot_ID: {self.BOT_ID}')
-        self.is_connect = True
-        self.msg_list = asyncio.queues.Queue()
-        self.pending = []
-
-    async def connect(self):
-        global gsconnecting
-        if not gsconnecting and not self.is_connect:
-            gsconnecting = True
+        # 开启发件箱时消息先落盘, Core断线或重启后不会丢失
+        self.outbox: Optional[DurableOutbox] = None
+        if self.config.get('outbox_enabled', False):
+            self.outbox = DurableOutbox(
+                self.config.get('outbox_path')
+                or Path(tempfile.gettempdir()) / 'gscore_adapter' / 'outbox.db',
+                ttl=self.config.get('outbox_ttl', 600),
+                maxsize=self.config.get('queue_maxsize', 1000),
+            )
+        self.msg_list: Union[OutboundQueue[MessageReceive], DurableOutbox] = (
+            self.outbox
+            or OutboundQueue(
+                maxsize=self.config.get('queue_maxsize', 1000),
+                policy=self.config.get('queue_policy', 'drop_oldest'),
+                block_timeout=self.config.get('queue_block_timeout', 5),
+                max_age=self.config.get('queue_max_age', 60),
+            )
+        )
+        self.prefilter = CommandPrefilter(
+            self.config.get('forward_prefixes', []),
+            self.config.get('forward_keywords', []),
+            follow_window=self.config.get('follow_window', 60),
+        )
+        self.limiter = RequestLimiter(
+            rate_per_minute=self.config.get('rate_limit_per_minute', 0),
+            burst=self.config.get('rate_limit_burst', 5),
+            coalesce_window=self.config.get('coalesce_window', 0),
+        )
+        self.limit_by = self.config.get('limit_by', 'user')
+        self._platforms: Dict[Tuple, PlatformInfo] = {}
+        # AstrBot消息组件 -> 转换函数; 引用消息中只处理图片、文本与At
+        self._converters: Dict[type, Converter] = {
+            Image: self._from_image,
+            File: self._from_file,
+            Plain: self._from_plain,
+            At: self._from_at,
+            Reply: self._from_reply,
+        }  # type: ignore
+        self._reply_converters: Dict[type, Converter] = {
+            Image: self._from_image,
+            Plain: self._from_plain,
+            At: self._from_at,
+        }  # type: ignore
+        self.tasks: List[asyncio.Task] = []
+
+    async def initialize(self):
+        for conn in self.router.connections:
+            logger.info(f'Bot_ID: {self.BOT_ID}连接至[gsuid-core]: {conn.url}...')
+        self.router.start()
+        self.spool.start()
+        if self.outbox is not None:
+            await self.outbox.open()
+        metrics_port = self.config.get('metrics_port', 0)
+        if metrics_port:
             try:
-                await self.async_connect()
-                logger.info('[gsuid-core]: 发起一次连接')
-                await self.start()
-                gsconnecting = False
-            except ConnectionRefusedError:
-                gsconnecting = False
-                logger.error(
-                    '[链接错误] Core服务器连接失败...请确认是否根据文档安装【早柚核心】！'
+                await self.metrics.serve(
+                    self.config.get('metrics_host', '127.0.0.1'), metrics_port
+                )
+            except OSError as e:
+                logger.warning(f'[GsCore] 指标接口启动失败: {e!r}')
+        self.tasks.append(asyncio.create_task(self.send_msg()))
+        sync_url = self.config.get('prefix_sync_url', '')
+        if sync_url:
+            self.tasks.append(
+                asyncio.create_task(
+                    self.prefilter.sync(
+                        sync_url,
+                        self.config.get('prefix_sync_interval', 600),
+                        self.config.get('forward_prefixes', []),
+                        self.config.get('forward_keywords', []),
+                    )
                 )
+            )
 
-    @filter.event_message_type(EventMessageType.ALL)
-    async def on_all_message(self, event: AstrMessageEvent):
-        if self.is_connect is False:
-            await self.connect()
+    async def terminate(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks.clear()
+        await self.router.stop()
+        await self.dispatcher.stop()
+        await self.spool.stop()
+        await self.metrics.stop()
+        if self.outbox is not None:
+            await self.outbox.close()
+        self.encoder.shutdown()
+
+    @property
+    def is_connect(self) -> bool:
+        return self.router.is_connect
+
+    def _connection(self, url: str, failover: bool = False) -> CoreConnection:
+        ping_interval = self.config.get('ping_interval', 20)
+        ping_timeout = self.config.get('ping_timeout', 20)
+        if failover:
+            ping_interval = min(ping_interval, self.config.get('failover_ping_interval', 3))
+            ping_timeout = min(ping_timeout, self.config.get('failover_ping_timeout', 5))
+        return CoreConnection(
+            url,
+            self.recv_msg,
+            ping_interval=ping_interval,
+            ping_timeout=ping_timeout,
+            backoff_max=self.config.get('reconnect_max_delay', 60),
+            wire_format=self.config.get('wire_format', 'json'),
+            compression=self.config.get('compression', True),
+            compression_level=self.config.get('compression_level', 6),
+            window_bits=self.config.get('compression_window_bits', 15),
+            max_size=self.config.get('max_frame_mb', 64) * 1024 * 1024,
+            metrics=self.metrics,
+        )
 
-        if not hasattr(self, 'ws'):
-            logger.error(
-                '[链接错误] Core服务器连接失败...请确认是否根据文档安装【早柚核心】！'
+    def _shard_key(self, msg: MessageReceive) -> str:
+        if self.shard_by == 'group' and msg.group_id:
+            return f'{msg.bot_id}:g:{msg.group_id}'
+        return f'{msg.bot_id}:u:{msg.user_id}'
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command('gscore状态')
+    async def show_status(self, event: AstrMessageEvent):
+        lines = [
+            f'[gsuid-core] {conn.url}: {"已连接" if conn.is_connect else "未连接"}'
+            for conn in self.router.shards
+        ]
+        lines.extend(
+            f'[热备] {conn.url}: {"已连接" if conn.is_connect else "未连接"}'
+            for conn in self.router.standbys
+        )
+        lines.append(
+            '发送队列: '
+            + ', '.join(f'{k}={v}' for k, v in self.msg_list.stats().items())
+        )
+        if self.prefilter.enabled:
+            lines.append(
+                '指令预筛: '
+                + ', '.join(f'{k}={v}' for k, v in self.prefilter.stats().items())
             )
+        lines.append(
+            '回复分发: '
+            + ', '.join(f'{k}={v}' for k, v in self.dispatcher.stats().items())
+        )
+        if self.limiter.enabled:
+            lines.append(
+                '限流合并: '
+                + ', '.join(f'{k}={v}' for k, v in self.limiter.stats().items())
+            )
+        if self.encoder.cache is not None:
+            lines.append(
+                '编码缓存: '
+                + ', '.join(f'{k}={v}' for k, v in self.encoder.cache.stats().items())
+            )
+        if self.encoder.shrinker is not None:
+            lines.append(
+                f'图片压缩: {self.encoder.shrunk}张, '
+                f'节省{self.encoder.shrink_saved / 1024 / 1024:.1f}MB'
+            )
+        lines.extend(self.metrics.summary())
+        yield event.plain_result('\n'.join(lines))
 
-        assert self.ws is not None
-        try:
-            await self.ws.ping()
-        except ConnectionClosed:
-            await self.connect()
+    @filter.event_message_type(EventMessageType.ALL)
+    async def on_all_message(self, event: AstrMessageEvent):
+        # 不可能触发Core指令的消息在此丢弃, 不再读取和编码其中的图片
+        if not self.prefilter.allow(
+            f'{event.get_platform_id()}:{event.get_sender_id()}',
+            event.message_str or '',
+        ):
+            return
+        if self.limiter.enabled:
+            reason = self.limiter.check(self._limit_key(event), self._signature(event))
+            if reason is not None:
+                self.log.debug(
+                    'filter', '[GsCore] 消息被拦下(%s): %s', reason, event.unified_msg_origin
+                )
+                return
 
-        user_name = event.get_sender_name()
+        trace = self.metrics.begin(event.get_session_id())
 
-        logger.debug(event.unified_msg_origin)
+        self.log.debug('event', '%s', event.unified_msg_origin)
 
         message_chain = (
             event.get_messages()
         )  # 用户所发的消息的消息链 # from astrbot.api.message_components import *
-        logger.info(message_chain)
-
-        pn = event.get_platform_name()
-        sender = {
-            'nickname': user_name,
-        }
-
-        self_id = event.get_self_id()
-        user_id = str(event.get_sender_id())
-        if pn == 'qq_official':
-            avatar = f'https://q.qlogo.cn/qqapp/{self_id}/{user_id}/100'
-        elif pn == 'aiocqhttp':
-            avatar = f'https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640'
-        else:
-            avatar = ''
-        sender['avatar'] = avatar
+        self.log.info('event', '%s', message_chain)
 
         message: List[GsMessage] = []
         for msg in message_chain:
-            if isinstance(msg, Image):
-                img_path = msg.path
-                if not img_path:
-                    img_path = msg.url
-                if img_path:
-                    if img_path.startswith('http'):
-                        message.append(
-                            GsMessage(
-                                type='image',
-                                data=img_path,
-                            )
-                        )
-                    else:
-                        if not os.path.exists(img_path):
-                            img_path = Path(__file__).parent / img_path
-                            async with aiofiles.open(img_path, 'rb') as f:
-                                img_data = await f.read()
-                            base64_data = b64encode(img_data).decode('utf-8')
-                            message.append(
-                                GsMessage(
-                                    type='image',
-                                    data=f'base64://{base64_data}',
-                                )
-                            )
-            elif isinstance(msg, File):
-                if msg.file_:
-                    file_val = await file_to_base64(Path(msg.file_))
-                else:
-                    file_val = msg.url
-                file_name = msg.name
-                message.append(
-                    GsMessage(
-                        type='file',
-                        data=f'{file_name}|{file_val}',
-                    )
-                )
-            elif isinstance(msg, Plain):
-                message.append(
-                    GsMessage(
-                        type='text',
-                        data=msg.text,
-                    )
-                )
-            elif isinstance(msg, At):
-                message.append(
-                    GsMessage(
-                        type='at',
-                        data=str(msg.qq),
-                    )
-                )
-            elif isinstance(msg, Reply):
-                message.append(
-                    GsMessage(
-                        type='reply',
-                        data=msg.id,
-                    )
-                )
-                # 处理引用消息中的内容（如图片）
-                if hasattr(msg, 'chain') and msg.chain:
-                    logger.debug(f'处理引用消息链，包含 {len(msg.chain)} 个组件')
-                    for reply_msg in msg.chain:
-                        try:
-                            if isinstance(reply_msg, Image):
-                                img_path = reply_msg.path
-                                if not img_path:
-                                    img_path = reply_msg.url
-                                if img_path:
-                                    logger.debug(f'处理引用消息中的图片: {img_path}')
-                                    if img_path.startswith('http'):
-                                        message.append(
-                                            GsMessage(
-                                                type='image',
-                                                data=img_path,
-                                            )
-                                        )
-                                        logger.debug(f'添加引用消息中的HTTP图片: {img_path}')
-                                    else:
-                                        if not os.path.exists(img_path):
-                                            img_path = Path(__file__).parent / img_path
-                                        if os.path.exists(img_path):
-                                            async with aiofiles.open(img_path, 'rb') as f:
-                                                img_data = await f.read()
-                                            base64_data = b64encode(img_data).decode('utf-8')
-                                            message.append(
-                                                GsMessage(
-                                                    type='image',
-                                                    data=f'base64://{base64_data}',
-                                                )
-                                            )
-                                            logger.debug(f'添加引用消息中的本地图片: {img_path}')
-                                        else:
-                                            logger.warning(f'引用消息中的图片文件不存在: {img_path}')
-                                else:
-                                    logger.warning(f'引用消息中的图片路径为空: {reply_msg}')
-                            elif isinstance(reply_msg, Plain):
-                                # 也处理引用消息中的文本内容
-                                message.append(
-                                    GsMessage(
-                                        type='text',
-                                        data=reply_msg.text,
-                                    )
-                                )
-                                logger.debug(f'添加引用消息中的文本: {reply_msg.text[:50]}...')
-                            elif isinstance(reply_msg, At):
-                                # 处理引用消息中的@消息
-                                message.append(
-                                    GsMessage(
-                                        type='at',
-                                        data=str(reply_msg.qq),
-                                    )
-                                )
-                                logger.debug(f'添加引用消息中的At: {reply_msg.qq}')
-                            else:
-                                logger.debug(f'引用消息中包含不支持的消息类型: {type(reply_msg)}')
-                        except Exception as e:
-                            logger.error(f'处理引用消息组件时出错: {type(reply_msg)}, 错误: {e}')
-                            continue
-            else:
+            if not await self._convert(msg, message, self._converters):
                 logger.warning(f'不支持的消息类型: {type(msg)}')
 
-        user_type = (
-            'group'
-            if event.get_message_type() == MessageType.GROUP_MESSAGE
-            else 'direct'
-        )
-        pm = 1 if event.is_admin() else 6
-
-        platform_id = event.get_platform_id()
-        if platform_id is None:
-            platform_id = self_id
-
+        platform = self._platform(event)
+        user_id = str(event.get_sender_id())
+        message_id = event.message_obj.message_id
         msg = MessageReceive(
-            # bot_id在gscore内部数据库具有唯一标识符，修改将会造成breaking change
-            bot_id='onebot' if pn == 'aiocqhttp' else pn,
-            bot_self_id=platform_id,
-            user_type=user_type,
+            bot_id=platform.bot_id,
+            bot_self_id=platform.bot_self_id,
+            user_type=(
+                'group'
+                if event.get_message_type() == MessageType.GROUP_MESSAGE
+                else 'direct'
+            ),
             group_id=event.get_group_id(),
             user_id=user_id,
-            sender=sender,
+            sender={
+                'nickname': event.get_sender_name(),
+                'avatar': platform.avatar.replace('{user_id}', user_id),
+            },
             content=message,
             msg_id=event.get_session_id(),
-            user_pm=pm,
+            user_pm=1 if event.is_admin() else 6,
+            idempotency_key=(
+                f'{platform.bot_self_id}:{message_id}'
+                if message_id
+                else uuid.uuid4().hex
+            ),
         )
-        logger.info(f'【发送】[gsuid-core]: {msg.bot_id}')
+        self.metrics.encoded(trace)
+        self.metrics.components_in.update(m.type for m in message)
+        self.log.info('forward', '【发送】[gsuid-core]: %s', msg.bot_id)
         await self._input(msg)
 
+    def _platform(self, event: AstrMessageEvent) -> PlatformInfo:
+        pn = event.get_platform_name()
+        self_id = event.get_self_id()
+        platform_id = event.get_platform_id()
+        key = (pn, platform_id, self_id)
+        info = self._platforms.get(key)
+        if info is None:
+            info = PlatformInfo(
+                # bot_id在gscore内部数据库具有唯一标识符，修改将会造成breaking change
+                bot_id='onebot' if pn == 'aiocqhttp' else pn,
+                bot_self_id=self_id if platform_id is None else platform_id,
+                avatar=AVATARS.get(pn, '').replace('{self_id}', str(self_id)),
+            )
+            self._platforms[key] = info
+        return info
+
+    async def _convert(
+        self,
+        comp: BaseMessageComponent,
+        out: List[GsMessage],
+        converters: Dict[type, Converter],
+    ) -> bool:
+        converter = converters.get(type(comp))
+        if converter is None:
+            # 组件的子类按基类处理
+            converter = next(
+                (converters[t] for t in type(comp).__mro__ if t in converters), None
+            )
+            if converter is None:
+                return False
+        await converter(comp, out)
+        return True
+
+    async def _from_plain(self, comp: Plain, out: List[GsMessage]):
+        out.append(GsMessage(type='text', data=comp.text))
+
+    async def _from_at(self, comp: At, out: List[GsMessage]):
+        out.append(GsMessage(type='at', data=str(comp.qq)))
+
+    async def _from_file(self, comp: File, out: List[GsMessage]):
+        file_name = comp.name
+        if comp.file_ and self.router.binary:
+            file_data = await self.encoder.encode_file(
+                Path(comp.file_), binary=True, name=file_name
+            )
+        else:
+            if comp.file_:
+                file_val = await self.encoder.encode_file(Path(comp.file_))
+            else:
+                file_val = comp.url
+            file_data = f'{file_name}|{file_val}'
+        out.append(GsMessage(type='file', data=file_data))
+
+    async def _from_reply(self, comp: Reply, out: List[GsMessage]):
+        out.append(GsMessage(type='reply', data=comp.id))
+        # 处理引用消息中的内容（如图片）
+        if not getattr(comp, 'chain', None):
+            return
+        self.log.debug('event', '处理引用消息链，包含 %s 个组件', len(comp.chain))
+        for reply_msg in comp.chain:
+            try:
+                if not await self._convert(reply_msg, out, self._reply_converters):
+                    self.log.debug(
+                        'event', '引用消息中包含不支持的消息类型: %s', type(reply_msg)
+                    )
+            except Exception as e:
+                logger.error(f'处理引用消息组件时出错: {type(reply_msg)}, 错误: {e}')
+
+    def _limit_key(self, event: AstrMessageEvent) -> Hashable:
+        if self.limit_by == 'session':
+            return event.unified_msg_origin
+        return f'{event.get_platform_id()}:{event.get_sender_id()}'
+
+    def _signature(self, event: AstrMessageEvent) -> Tuple:
+        # 附件只取来源地址, 不读取内容
+        attachments = []
+        for c in event.get_messages():
+            if isinstance(c, Image):
+                attachments.append(c.url or c.file or c.path)
+            elif isinstance(c, File):
+                attachments.append(c.url or c.file_)
+        return event.message_str, tuple(attachments)
+
+    async def _from_image(self, img: Image, out: List[GsMessage]):
+        img_path = img.path
+        if not img_path:
+            img_path = img.url
+        if not img_path:
+            logger.warning(f'图片路径为空: {img}')
+            return
+
+        if img_path.startswith('http'):
+            out.append(GsMessage(type='image', data=img_path))
+            return
+
+        if not os.path.exists(img_path):
+            img_path = Path(__file__).parent / img_path
+        if not os.path.exists(img_path):
+            logger.warning(f'图片文件不存在: {img_path}')
+            return
+
+        # 读取与编码在线程池中完成, 不阻塞事件循环
+        if self.router.binary:
+            raw = await self.encoder.encode_image(img_path, binary=True)
+            out.append(GsMessage(type='image', data=raw))
+            return
+        base64_data = await self.encoder.encode_image(img_path)
+        out.append(GsMessage(type='image', data=f'base64://{base64_data}'))
+
     async def _input(self, msg: MessageReceive):
         await self.msg_list.put(msg)
 
     async def send_msg(self):
         while True:
-            msg: MessageReceive = await self.msg_list.get()
-            msg_send = msgjson.encode(msg)
-            await self.ws.send(msg_send)
-
-    async def start(self):
-        asyncio.create_task(self.recv_msg())
-        asyncio.create_task(self.send_msg())
-        # _, self.pending = await asyncio.wait(
-        #     [recv_task, send_task],
-        #     return_when=asyncio.FIRST_COMPLETED,
-        # )
-
-    async def recv_msg(self):
-        try:
-            await asyncio.sleep(5)
-            async for message in self.ws:
-                try:
-                    msg = msgjson.decode(message, type=MessageSend)
-                    logger.info(
-                        f'【接收】[gsuid-core]: '
-                        f'{msg.bot_id} - {msg.target_type} - {msg.target_id}'
-                    )
-                    # 解析消息
-                    if msg.bot_id == 'AstrBot':
-                        if msg.content:
-                            _data = msg.content[0]
-                            if _data.type and _data.type.startswith('log'):
-                                _type = _data.type.split('_')[-1].lower()
-                                getattr(logger, _type)(_data.data)
-                        continue
-
-                    bid = msg.bot_id
-                    if bid == 'aiocqhttp' or bid == 'dingtalk' or bid == 'onebot':
-                        session_id = msg.target_id
-                    elif bid == 'lark':
-                        session_id = msg.target_id
-                    elif bid == 'dingtalk':
-                        session_id = msg.target_id
-                    elif bid == 'wechatpadpro':
-                        session_id = msg.target_id
-                    else:
-                        session_id = msg.msg_id
-
-                    if session_id is None:
-                        logger.warning(f'[GsCore] 消息{msg}没有session_id')
-                        continue
-
-                    if msg.target_id and msg.content:
-                        session = MessageSesion(
-                            msg.bot_self_id,
-                            (
-                                MessageType.GROUP_MESSAGE
-                                if msg.target_type == 'group'
-                                else MessageType.FRIEND_MESSAGE
-                            ),
-                            session_id,
-                        )
-                        await self.bot_send_msg(msg.content, session, bid)
-                except Exception as e:
-                    logger.exception(e)
-        except RuntimeError:
-            pass
-        except ConnectionClosedError:
-            for task in self.pending:
-                task.cancel()
-            logger.warning(f'与[gsuid-core]断开连接! Bot_ID: {self.BOT_ID}')
-            self.is_alive = False
-            for _ in range(30):
-                await asyncio.sleep(5)
-                try:
-                    await self.async_connect()
-                    await self.start()
-                    break
-                except:  # noqa
-                    logger.debug('自动连接core服务器失败...五秒后重新连接...')
+            # 断线期间消息留在队列中, 由队列负责溢出与过期处理
+            try:
+                await self.router.wait_ready()
+                msg: MessageReceive = await self.msg_list.get()
+            except Exception as e:
+                # 如发件箱读取出错, 稍后重试, 发送循环不能退出
+                logger.exception(e)
+                await asyncio.sleep(1)
+                continue
+            try:
+                await self.router.send(self._shard_key(msg), msg)
+            except Exception as e:
+                # 编码等出错的消息重试也不会成功, 记录后丢弃
+                logger.error(f'[GsCore] 发送消息失败, 已丢弃: {e!r}')
+            try:
+                self.msg_list.task_done()
+            except Exception as e:
+                logger.exception(e)
+
+    async def recv_msg(self, msg: MessageSend):
+        self.log.info(
+            'reply',
+            '【接收】[gsuid-core]: %s - %s - %s',
+            msg.bot_id,
+            msg.target_type,
+            msg.target_id,
+        )
+        replied, trace = self.metrics.reply(msg.msg_id)
+        if msg.content:
+            self.metrics.components_out.update(c.type for c in msg.content)
+        # 解析消息
+        if msg.bot_id == 'AstrBot':
+            if msg.content:
+                _data = msg.content[0]
+                if isinstance(_data, LogSegment):
+                    getattr(logger, _data.level)(_data.data)
+            return
+
+        bid = msg.bot_id
+        if bid == 'aiocqhttp' or bid == 'dingtalk' or bid == 'onebot':
+            session_id = msg.target_id
+        elif bid == 'lark':
+            session_id = msg.target_id
+        elif bid == 'dingtalk':
+            session_id = msg.target_id
+        elif bid == 'wechatpadpro':
+            session_id = msg.target_id
+        else:
+            session_id = msg.msg_id
+
+        if session_id is None:
+            logger.warning(f'[GsCore] 消息{msg}没有session_id')
+            return
+
+        if msg.target_id and msg.content:
+            session = MessageSesion(
+                msg.bot_self_id,
+                (
+                    MessageType.GROUP_MESSAGE
+                    if msg.target_type == 'group'
+                    else MessageType.FRIEND_MESSAGE
+                ),
+                session_id,
+            )
+            # 同一会话按序发送, 不同会话互不阻塞
+            content = msg.content
+            self.dispatcher.submit(
+                (bid, msg.target_type, msg.target_id),
+                lambda: self.bot_send_msg(content, session, bid, replied, trace),
+            )
+
+    async def _spill_image(
+        self, seg: ImageSegment, spilled: List[Path]
+    ) -> Optional[Image]:
+        data = seg.data
+        if isinstance(data, bytes):
+            if len(data) < self.spill_bytes:
+                return None
+            path = await self.spool.store_bytes(
+                f'image{image_suffix(data[:12])}', data, hold=True
+            )
+        else:
+            if data.startswith('link://'):
+                return None
+            start = 9 if data.startswith('base64://') else 0
+            if (len(data) - start) * 3 // 4 < self.spill_bytes:
+                return None
+            head = base64_head(data, start)
+            path = await self.spool.store_base64(
+                f'image{image_suffix(head)}', data, start, hold=True
+            )
+        # 释放对base64的引用, 发送期间内存中只剩磁盘上的一份
+        seg.data = None
+        spilled.append(path)
+        return Image.fromFileSystem(str(path))
 
     async def _to_msg(
-        self, msg: List[GsMessage], bot_id: str
+        self,
+        msg: List[SendSegment],
+        bot_id: str,
+        spilled: Optional[List[Path]] = None,
     ) -> List[BaseMessageComponent]:
+        if spilled is None:
+            spilled = []
         message = []
         for _c in msg:
             if _c.data:
-                if _c.type == 'text':
+                if isinstance(_c, TextSegment):
                     message.append(Plain(_c.data))
-                elif _c.type == 'image':
-                    if _c.data.startswith('link://'):
+                elif isinstance(_c, ImageSegment):
+                    spilled_img = (
+                        await self._spill_image(_c, spilled)
+                        if self.spill_bytes > 0
+                        else None
+                    )
+                    if spilled_img is not None:
+                        message.append(spilled_img)
+                    elif isinstance(_c.data, bytes):
+                        # msgpack模式下为原始图片内容
+                        message.append(Image.fromBytes(_c.data))
+                    elif _c.data.startswith('link://'):
                         message.append(Image.fromURL(_c.data[7:]))
                     else:
                         if _c.data.startswith('base64://'):
@@ -363,18 +593,13 @@ class GsCoreAdapter(Star):
                         message.append(
                             Image.fromBase64(_c.data),  # type: ignore
                         )
-                elif _c.type == 'node':
+                elif isinstance(_c, NodeSegment):
                     # 特殊处理 qq 平台
                     if bot_id == 'onebot':
                         node_message: List[Node] = []
                         for _node in _c.data:
                             node_message.append(
-                                Node(
-                                    await self._to_msg(
-                                        [GsMessage(**_node)],
-                                        bot_id,
-                                    )
-                                )
+                                Node(await self._to_msg([_node], bot_id, spilled))
                             )
 
                         # 将一条消息转为多条消息，优化观感
@@ -384,56 +609,41 @@ class GsCoreAdapter(Star):
                             )
                         )
                     else:
-                        for _node in _c.data:
-                            message.extend(
-                                await self._to_msg(
-                                    [GsMessage(**_node)],
-                                    bot_id,
-                                )
-                            )
-                elif _c.type == 'file':
-                    file_name, file_content = _c.data.split('|')
-                    path = Path(__file__).resolve().parent / file_name
-                    store_file(path, file_content)
+                        message.extend(
+                            await self._to_msg(_c.data, bot_id, spilled)
+                        )
+                elif isinstance(_c, FileSegment):
+                    if isinstance(_c.data, tuple):
+                        # msgpack模式下为[文件名, 原始内容]
+                        file_name, file_content = _c.data
+                        path = await self.spool.store_bytes(file_name, file_content)
+                    else:
+                        file_name, file_content = _c.data.rsplit('|', 1)
+                        path = await self.spool.store_base64(file_name, file_content)
                     message.append(File(file_name, str(path)))
-                elif _c.type == 'at':
-                    message.append(At(qq=_c.data))
+                elif isinstance(_c, AtSegment):
+                    message.append(At(qq=str(_c.data)))
         return message
 
     async def bot_send_msg(
         self,
-        gsmsgs: List[GsMessage],
+        gsmsgs: List[SendSegment],
         session: MessageSesion,
         bot_id: str,
+        replied: float = 0,
+        trace: Optional[Trace] = None,
     ):
-        messages = MessageChain()
-        message = await self._to_msg(gsmsgs, bot_id)
-
-        messages.chain.extend(message)
-        logger.info(f'【即将发送】[gsuid-core]: {messages}')
-        await self.context.send_message(session, messages)
-
-
-def store_file(path: Path, file: str):
-    file_content = base64.b64decode(file)
-    with open(path, 'wb') as f:
-        f.write(file_content)
-
-
-def del_file(path: Path):
-    if path.exists():
-        os.remove(path)
-
-
-async def file_to_base64(file_path: Path):
-    # 读取文件内容
-    async with aiofiles.open(str(file_path), 'rb') as file:
-        file_content = await file.read()
-
-    # 将文件内容转换为base64编码
-    base64_encoded = b64encode(file_content)
-
-    # 将base64编码的字节转换为字符串
-    base64_string = base64_encoded.decode('utf-8')
-
-    return base64_string
+        spilled: List[Path] = []
+        try:
+            messages = MessageChain()
+            message = await self._to_msg(gsmsgs, bot_id, spilled)
+
+            messages.chain.extend(message)
+            self.log.info('deliver', '【即将发送】[gsuid-core]: %s', messages)
+            await self.context.send_message(session, messages)
+            if replied:
+                self.metrics.delivered(replied, trace)
+        finally:
+            # 落盘的图片仅供本次发送使用
+            for path in spilled:
+                self.spool.release(path)
@@ -0,0 +1,210 @@
+import bisect
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from astrbot.api import logger
+
+# 毫秒
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+STAGES = {
+    'encode': '收到事件 -> 编码完成',
+    'queue': '编码完成 -> 写入websocket',
+    'core': '写入websocket -> 收到首条回复',
+    'deliver': '收到回复 -> 平台发送完成',
+    'total': '收到事件 -> 首条回复发送完成',
+}
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        '''按桶估计分位数, 取所在桶的上界'''
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Trace:
+    __slots__ = ('key', 'received', 'encoded', 'sent')
+
+    def __init__(self, key: str, received: float):
+        self.key = key
+        self.received = received
+        self.encoded = 0.0
+        self.sent = 0.0
+
+
+class Metrics:
+    '''
+    适配器端到端延迟与流量统计
+
+    每条转发的事件按`msg_id`建立一条追踪, 依次记录收到事件、编码完成、
+    写入websocket、收到Core的首条回复与平台发送完成的时间, 汇总为分阶段的延迟直方图;
+    同一`msg_id`(即会话)下, 回复与最近一条已发送的事件配对,
+    更早的已发送事件视为没有回复(多数闲聊消息Core不会回复);
+    未发送也未收到回复的追踪在`trace_ttl`秒后丢弃, 不会无限堆积
+    '''
+
+    def __init__(self, trace_ttl: float = 300, max_traces: int = 10000):
+        self.trace_ttl = trace_ttl
+        self.max_traces = max_traces
+        self.stages: Dict[str, Histogram] = {s: Histogram() for s in STAGES}
+        self.counters: Counter = Counter()
+        self.components_in: Counter = Counter()
+        self.components_out: Counter = Counter()
+        self._pending: Dict[str, Deque[Trace]] = {}
+        self._traces = 0
+        self._server: Optional[web.AppRunner] = None
+
+    def begin(self, key: str) -> Trace:
+        now = time.monotonic()
+        if self._traces >= self.max_traces:
+            self._prune(now)
+        trace = Trace(key, now)
+        self._pending.setdefault(key, deque()).append(trace)
+        self._traces += 1
+        self.counters['events'] += 1
+        return trace
+
+    def encoded(self, trace: Trace):
+        trace.encoded = time.monotonic()
+        self._observe('encode', trace.encoded - trace.received)
+
+    def sent(self, key: str, size: int):
+        self.counters['messages_sent'] += 1
+        self.counters['bytes_sent'] += size
+        for trace in self._pending.get(key, ()):
+            if not trace.sent:
+                trace.sent = time.monotonic()
+                if trace.encoded:
+                    self._observe('queue', trace.sent - trace.encoded)
+                return
+
+    def received(self, size: int):
+        self.counters['messages_received'] += 1
+        self.counters['bytes_received'] += size
+
+    def reply(self, key: str) -> Tuple[float, Optional[Trace]]:
+        '''
+        收到Core的回复, 返回收到的时间, 以及该回复是首条回复时对应的追踪
+        '''
+        now = time.monotonic()
+        pending = self._pending.get(key)
+        if not pending or not pending[0].sent:
+            return now, None
+        trace = pending.popleft()
+        self._traces -= 1
+        # 回复属于最近发送的一条, 之前发送的都是Core没有回复的消息
+        while pending and pending[0].sent:
+            trace = pending.popleft()
+            self._traces -= 1
+            self.counters['traces_unreplied'] += 1
+        if not pending:
+            del self._pending[key]
+        self._observe('core', now - trace.sent)
+        return now, trace
+
+    def delivered(self, replied: float, trace: Optional[Trace]):
+        now = time.monotonic()
+        self.counters['replies_delivered'] += 1
+        self._observe('deliver', now - replied)
+        if trace is not None:
+            self._observe('total', now - trace.received)
+
+    def _observe(self, stage: str, seconds: float):
+        self.stages[stage].observe(seconds * 1000)
+
+    def _prune(self, now: float):
+        for key in list(self._pending):
+            pending = self._pending[key]
+            while pending and now - pending[0].received > self.trace_ttl:
+                pending.popleft()
+                self._traces -= 1
+                self.counters['traces_expired'] += 1
+            if not pending:
+                del self._pending[key]
+
+    def summary(self) -> List[str]:
+        lines = []
+        for stage, hist in self.stages.items():
+            if not hist.count:
+                continue
+            lines.append(
+                f'{stage}({STAGES[stage]}): n={hist.count}, '
+                f'avg={hist.sum / hist.count:.1f}ms, '
+                f'p50≤{hist.quantile(0.5):g}ms, p99≤{hist.quantile(0.99):g}ms'
+            )
+        lines.append(', '.join(f'{k}={v}' for k, v in sorted(self.counters.items())))
+        for name, counter in (
+            ('上行消息段', self.components_in),
+            ('下行消息段', self.components_out),
+        ):
+            if counter:
+                lines.append(
+                    f'{name}: '
+                    + ', '.join(f'{k}={v}' for k, v in counter.most_common())
+                )
+        return lines
+
+    def render(self) -> str:
+        '''Prometheus文本格式'''
+        out = []
+        name = 'gscore_stage_latency_ms'
+        out.append(f'# TYPE {name} histogram')
+        for stage, hist in self.stages.items():
+            seen = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                seen += n
+                out.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {seen}')
+            out.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            out.append(f'{name}_sum{{stage="{stage}"}} {hist.sum:.3f}')
+            out.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+        for key, value in sorted(self.counters.items()):
+            out.append(f'# TYPE gscore_{key}_total counter')
+            out.append(f'gscore_{key}_total {value}')
+        for direction, counter in (
+            ('in', self.components_in),
+            ('out', self.components_out),
+        ):
+            name = f'gscore_components_{direction}_total'
+            out.append(f'# TYPE {name} counter')
+            for seg, value in sorted(counter.items()):
+                out.append(f'{name}{{type="{seg}"}} {value}')
+        out.append('# TYPE gscore_pending_traces gauge')
+        out.append(f'gscore_pending_traces {self._traces}')
+        return '\n'.join(out) + '\n'
+
+    async def serve(self, host: str, port: int):
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=self.render())
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self._server = web.AppRunner(app, access_log=None)
+        await self._server.setup()
+        await web.TCPSite(self._server, host, port).start()
+        logger.info(f'[GsCore] 指标接口: http://{host}:{port}/metrics')
+
+    async def stop(self):
+        if self._server is not None:
+            await self._server.cleanup()
+            self._server = None
@@ -1,6 +1,30 @@
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 
-from msgspec import Struct
+from msgspec import Raw, Struct, defstruct
+
+
+class RawPayload(bytes):
+    '''
+    图片/文件的原始内容
+
+    msgpack模式下以二进制原样发送, JSON模式下才转为`base64://`字符串
+    '''
+
+
+class RawFile(bytes):
+    '''
+    带文件名的文件原始内容
+
+    msgpack模式下发送为`[name, bytes]`, JSON模式下为`name|base64`
+    '''
+
+    name: str
+
+    @classmethod
+    def create(cls, name: str, content: bytes) -> 'RawFile':
+        obj = cls(content)
+        obj.name = name
+        return obj
 
 
 class Message(Struct):
@@ -18,6 +42,8 @@ class MessageReceive(Struct):
     sender: Dict[str, Any] = {}
     user_pm: int = 3
     content: List[Message] = []
+    # 同一条用户消息重发时保持不变, 供Core去重
+    idempotency_key: str = ''
 
 
 class MessageContent(Struct):
@@ -31,10 +57,102 @@ class MessageContent(Struct):
     at_list: List[Any] = []
 
 
+class Segment(Struct, tag_field='type'):
+    '''[gsuid-core]回复中的消息段, 以`type`为标签一次性解码为具体类型'''
+
+    @property
+    def type(self) -> str:
+        return self.__struct_config__.tag  # type: ignore
+
+
+class TextSegment(Segment, tag='text'):
+    data: str = ''
+
+
+class ImageSegment(Segment, tag='image'):
+    # JSON模式下为`base64://`/`link://`字符串, msgpack模式下为原始字节
+    data: Any = None
+
+
+class AtSegment(Segment, tag='at'):
+    data: Union[str, int] = ''
+
+
+class FileSegment(Segment, tag='file'):
+    # JSON模式下为`name|base64`, msgpack模式下为(name, bytes)
+    data: Union[str, Tuple[str, bytes]] = ''
+
+
+class NodeSegment(Segment, tag='node'):
+    data: List['SendSegment'] = []
+
+
+class LogSegment(Segment):
+    data: Any = None
+
+    @property
+    def level(self) -> str:
+        return self.type.split('_')[-1].lower()
+
+
+# 适配器不处理, 但Core常规会发送的消息段, 纳入联合类型以免整条消息走逐段解码的退路
+_IGNORED_TAGS = (
+    'reply',
+    'markdown',
+    'template_markdown',
+    'buttons',
+    'template_buttons',
+    'image_size',
+    'group',
+)
+_LOG_LEVELS = ('TRACE', 'DEBUG', 'INFO', 'SUCCESS', 'WARNING', 'ERROR', 'CRITICAL')
+
+IgnoredSegments = tuple(
+    defstruct(
+        f'{tag.title().replace("_", "")}Segment',
+        [('data', Any, None)],
+        bases=(Segment,),
+        tag=tag,
+    )
+    for tag in _IGNORED_TAGS
+)
+LogSegments = tuple(
+    defstruct(f'Log{lv.title()}Segment', [], bases=(LogSegment,), tag=f'log_{lv}')
+    for lv in _LOG_LEVELS
+)
+# 联合类型只匹配Core使用的大写标签, 其余大小写写法由退路按小写查找
+LOG_SEGMENTS = {seg.__struct_config__.tag.lower(): seg for seg in LogSegments}
+
+SendSegment = Union[  # type: ignore
+    (TextSegment, ImageSegment, AtSegment, FileSegment, NodeSegment)
+    + IgnoredSegments
+    + LogSegments
+]
+
+
 class MessageSend(Struct):
     bot_id: str = 'Bot'
     bot_self_id: str = ''
     msg_id: str = ''
     target_type: Optional[str] = None
     target_id: str | None = ''
-    content: Optional[List[Message]] = None
+    content: Optional[List[SendSegment]] = None  # type: ignore
+
+
+class RawMessageSend(Struct):
+    '''含未知消息段时的退路: 逐段解码, 跳过无法识别的消息段'''
+
+    bot_id: str = 'Bot'
+    bot_self_id: str = ''
+    msg_id: str = ''
+    target_type: Optional[str] = None
+    target_id: str | None = ''
+    content: Optional[List[Raw]] = None
+
+
+class RawSegment(Struct):
+    '''退路中单个消息段的原始形式: 拆开node消息段, 或按小写识别log消息段'''
+
+    type: Optional[str] = None
+    # 缺省时为空
+    data: Raw = Raw()
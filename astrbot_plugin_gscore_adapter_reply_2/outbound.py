@@ -0,0 +1,100 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Generic, Literal, Tuple, TypeVar
+
+from astrbot.api import logger
+
+T = TypeVar('T')
+
+OverflowPolicy = Literal['drop_oldest', 'drop_newest', 'block']
+
+
+class OutboundQueue(Generic[T]):
+    '''
+    发往[gsuid-core]的有界消息队列
+
+    队列满时按`policy`处理:
+    - drop_oldest: 丢弃最早的消息, 为新消息腾出位置
+    - drop_newest: 丢弃新消息
+    - block: 等待至多`block_timeout`秒, 超时则丢弃新消息
+    出队时丢弃排队超过`max_age`秒的消息, 避免断线恢复后重放过时的指令
+    '''
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        policy: OverflowPolicy = 'drop_oldest',
+        block_timeout: float = 5,
+        max_age: float = 60,
+    ):
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_age = max_age
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.expired = 0
+        self._items: Deque[Tuple[float, T]] = deque()
+        self._cond = asyncio.Condition()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def _drop(self, reason: str):
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 100 == 0:
+            logger.warning(
+                f'[GsCore] 发送队列已满({self.maxsize}), {reason}, '
+                f'累计丢弃{self.dropped}条'
+            )
+
+    async def put(self, item: T) -> bool:
+        async with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.policy == 'drop_oldest':
+                    self._items.popleft()
+                    self._drop('丢弃最早的消息')
+                elif self.policy == 'drop_newest':
+                    self._drop('丢弃新消息')
+                    return False
+                else:
+                    try:
+                        await asyncio.wait_for(
+                            self._cond.wait_for(
+                                lambda: len(self._items) < self.maxsize
+                            ),
+                            self.block_timeout,
+                        )
+                    except asyncio.TimeoutError:
+                        self._drop('等待超时, 丢弃新消息')
+                        return False
+
+            self._items.append((time.monotonic(), item))
+            self.enqueued += 1
+            self._cond.notify_all()
+            return True
+
+    async def get(self) -> T:
+        async with self._cond:
+            while True:
+                await self._cond.wait_for(lambda: bool(self._items))
+                ts, item = self._items.popleft()
+                self._cond.notify_all()
+                if self.max_age > 0 and time.monotonic() - ts > self.max_age:
+                    self.expired += 1
+                    continue
+                return item
+
+    def task_done(self):
+        '''与DurableOutbox保持一致, 内存队列出队即视为完成'''
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'depth': len(self._items),
+            'maxsize': self.maxsize,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'expired': self.expired,
+        }
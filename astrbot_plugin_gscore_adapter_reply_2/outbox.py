@@ -0,0 +1,170 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from astrbot.api import logger
+
+from . import codec
+from .models import MessageReceive
+
+
+class DurableOutbox:
+    '''
+    落盘的[gsuid-core]发件箱
+
+    消息写入SQLite(WAL模式)后才算入队, 成功写入websocket并`task_done`后才删除,
+    Core断线或AstrBot重启期间的指令不会丢失, 恢复连接后按入队顺序补发;
+    每条消息带有入队时确定的`idempotency_key`, 重放时保持不变, 供Core去重;
+    超过`ttl`秒仍未发出的消息直接丢弃, 超过`maxsize`条时丢弃最早的消息;
+    所有数据库操作在同一个专用线程中顺序执行, 不阻塞事件循环
+    '''
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ttl: float = 600,
+        maxsize: int = 10000,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.expired = 0
+        self.duplicates = 0
+        self.replayed = 0
+        self._depth = 0
+        self._inflight: Optional[int] = None
+        self._nonempty = asyncio.Event()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='gscore-outbox')
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def open(self):
+        self._depth = await self._run(self._open)
+        self.replayed = self._depth
+        if self._depth:
+            logger.info(f'[GsCore] 发件箱中有{self._depth}条未发送的消息, 连接后补发')
+            self._nonempty.set()
+
+    def _open(self) -> int:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.path, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'key TEXT NOT NULL UNIQUE, '
+            'expires REAL NOT NULL, '
+            'payload BLOB NOT NULL)'
+        )
+        self._db = db
+        return db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    async def close(self):
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=False)
+
+    def qsize(self) -> int:
+        return self._depth
+
+    async def put(self, item: MessageReceive, ttl: Optional[float] = None) -> bool:
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        excess = self._depth + 1 - self.maxsize
+        inserted, dropped = await self._run(
+            self._insert, item.idempotency_key, codec.dump(item), expires, excess
+        )
+        if dropped:
+            self._depth -= dropped
+            self.dropped += dropped
+            if self.dropped == dropped or self.dropped % 100 == 0:
+                logger.warning(
+                    f'[GsCore] 发件箱已满({self.maxsize}), 丢弃最早的消息, '
+                    f'累计丢弃{self.dropped}条'
+                )
+        if not inserted:
+            self.duplicates += 1
+            return False
+        self._depth += 1
+        self.enqueued += 1
+        self._nonempty.set()
+        return True
+
+    def _insert(
+        self, key: str, payload: bytes, expires: float, excess: int
+    ) -> Tuple[bool, int]:
+        assert self._db is not None
+        cur = self._db.execute(
+            'INSERT OR IGNORE INTO outbox (key, expires, payload) VALUES (?, ?, ?)',
+            (key, expires, payload),
+        )
+        if cur.rowcount == 0:
+            return False, 0
+        dropped = 0
+        if excess > 0:
+            # 正在发送的消息不参与淘汰, 由task_done删除
+            dropped = self._db.execute(
+                'DELETE FROM outbox WHERE id IN '
+                '(SELECT id FROM outbox WHERE id IS NOT ? ORDER BY id LIMIT ?)',
+                (self._inflight, excess),
+            ).rowcount
+        return True, dropped
+
+    async def get(self) -> MessageReceive:
+        while True:
+            await self._nonempty.wait()
+            expired, row = await self._run(self._head, time.time())
+            if expired:
+                self._depth -= expired
+                self.expired += expired
+            if row is None:
+                self._depth = 0
+                self._nonempty.clear()
+                continue
+            self._inflight = row[0]
+            return codec.load(row[1])
+
+    def _head(self, now: float) -> Tuple[int, Optional[Tuple[int, bytes]]]:
+        assert self._db is not None
+        expired = self._db.execute(
+            'DELETE FROM outbox WHERE expires < ? AND id IS NOT ?',
+            (now, self._inflight),
+        ).rowcount
+        row = self._db.execute(
+            'SELECT id, payload FROM outbox WHERE id > ? ORDER BY id LIMIT 1',
+            (self._inflight or 0,),
+        ).fetchone()
+        return expired, row
+
+    def task_done(self):
+        '''当前消息已写入websocket, 从发件箱中删除'''
+        if self._inflight is None or self._db is None:
+            return
+        # 与后续的查询在同一线程中排队执行, 无需等待
+        self._executor.submit(self._delete, self._inflight)
+        self._depth -= 1
+
+    def _delete(self, row_id: int):
+        assert self._db is not None
+        self._db.execute('DELETE FROM outbox WHERE id = ?', (row_id,))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'depth': self._depth,
+            'maxsize': self.maxsize,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'expired': self.expired,
+            'duplicates': self.duplicates,
+            'replayed': self.replayed,
+        }
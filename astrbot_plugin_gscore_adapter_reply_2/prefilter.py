@@ -0,0 +1,116 @@
+import asyncio
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+from astrbot.api import logger
+
+
+class CommandPrefilter:
+    '''
+    转发前的指令预筛
+
+    前缀与关键词编译为同一个正则, 不可能触发Core指令的消息在本地直接丢弃,
+    不再读取/编码其中的图片; 未配置任何前缀与关键词时全部转发;
+    用户的指令被转发后`follow_window`秒内, 其后续消息也会转发,
+    以免打断Core等待用户回复(如先发指令再发图片)的交互
+    '''
+
+    def __init__(
+        self,
+        prefixes: Iterable[str] = (),
+        keywords: Iterable[str] = (),
+        follow_window: float = 60,
+    ):
+        self.follow_window = follow_window
+        self.passed = 0
+        self.dropped = 0
+        self._prefixes: List[str] = []
+        self._keywords: List[str] = []
+        self._pattern: Optional[re.Pattern] = None
+        self._recent: Dict[str, float] = {}
+        self.update(prefixes, keywords)
+
+    @property
+    def enabled(self) -> bool:
+        return self._pattern is not None
+
+    def update(self, prefixes: Iterable[str], keywords: Iterable[str]):
+        # 长的在前, 避免短前缀抢先匹配
+        self._prefixes = sorted({p for p in prefixes if p}, key=len, reverse=True)
+        self._keywords = sorted({k for k in keywords if k}, key=len, reverse=True)
+        parts = []
+        if self._prefixes:
+            parts.append(
+                r'^\s*(?:' + '|'.join(map(re.escape, self._prefixes)) + ')'
+            )
+        if self._keywords:
+            parts.append('(?:' + '|'.join(map(re.escape, self._keywords)) + ')')
+        self._pattern = re.compile('|'.join(parts), re.I) if parts else None
+
+    def allow(self, key: str, text: str) -> bool:
+        if self._pattern is None:
+            return True
+
+        now = time.monotonic()
+        if self._pattern.search(text):
+            self._touch(key, now)
+            self.passed += 1
+            return True
+
+        # 窗口只由指令刷新, 否则持续聊天的用户每条消息都会被转发
+        last = self._recent.get(key)
+        if last is not None and now - last <= self.follow_window:
+            self.passed += 1
+            return True
+
+        self.dropped += 1
+        return False
+
+    def _touch(self, key: str, now: float):
+        self._recent[key] = now
+        if len(self._recent) > 10000:
+            self._recent = {
+                k: t
+                for k, t in self._recent.items()
+                if now - t <= self.follow_window
+            }
+
+    async def sync(self, url: str, interval: float, base_prefixes, base_keywords):
+        '''
+        定期从`url`拉取指令表, 与配置中的前缀/关键词合并
+
+        接受JSON数组(视为前缀), 或`{"prefixes": [...], "keywords": [...]}`
+        '''
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(url, timeout=aiohttp.ClientTimeout(10)) as r:
+                        data = await r.json(content_type=None)
+                if isinstance(data, list):
+                    prefixes, keywords = data, []
+                else:
+                    prefixes = data.get('prefixes', [])
+                    keywords = data.get('keywords', [])
+                self.update(
+                    [*base_prefixes, *prefixes],
+                    [*base_keywords, *keywords],
+                )
+                logger.debug(
+                    f'[GsCore] 已同步指令表: {len(self._prefixes)}个前缀, '
+                    f'{len(self._keywords)}个关键词'
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'[GsCore] 同步指令表失败: {e!r}')
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'prefixes': len(self._prefixes),
+            'keywords': len(self._keywords),
+            'passed': self.passed,
+            'dropped': self.dropped,
+        }
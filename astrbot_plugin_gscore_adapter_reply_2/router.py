@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+from typing import List, Optional
+
+from .connection import CoreConnection
+from .models import MessageReceive
+
+
+def build_url(endpoint: str, bot_id: str) -> str:
+    '''`host:port`或完整的ws地址, 统一为`ws://host:port/ws/BOT_ID`'''
+    endpoint = endpoint.strip().rstrip('/')
+    if endpoint.startswith(('ws://', 'wss://')):
+        if '/ws/' in endpoint:
+            return endpoint
+        return f'{endpoint}/ws/{bot_id}'
+    return f'ws://{endpoint}/ws/{bot_id}'
+
+
+def _score(key: str, url: str) -> int:
+    digest = hashlib.blake2b(f'{key}|{url}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class CoreRouter:
+    '''
+    将消息分片到多个[gsuid-core]实例, 并在分片故障时切换到热备实例
+
+    使用最高随机权重(rendezvous)哈希: 同一个键始终落在同一个分片上;
+    分片断线时, 其流量优先转到第一个可用的热备实例, 无热备时按排名顺延至下一个分片,
+    其余键不受影响; 热备实例与分片同时保持连接和心跳, 故障发生时无需等待建连;
+    分片恢复并稳定连接`failback_delay`秒后, 流量自动切回
+    '''
+
+    def __init__(
+        self,
+        shards: List[CoreConnection],
+        standbys: Optional[List[CoreConnection]] = None,
+        failback_delay: float = 10,
+    ):
+        self.shards = shards
+        self.standbys = standbys or []
+        self.failback_delay = failback_delay
+
+    @property
+    def connections(self) -> List[CoreConnection]:
+        return self.shards + self.standbys
+
+    @property
+    def is_connect(self) -> bool:
+        return any(c.is_connect for c in self.connections)
+
+    def start(self):
+        for conn in self.connections:
+            conn.start()
+
+    async def stop(self):
+        await asyncio.gather(*(c.stop() for c in self.connections))
+
+    def _healthy(self, conn: CoreConnection) -> bool:
+        return conn.is_connect and conn.uptime >= self.failback_delay
+
+    def rank(self, key: str) -> List[CoreConnection]:
+        if len(self.shards) == 1:
+            return self.shards
+        return sorted(self.shards, key=lambda c: _score(key, c.url), reverse=True)
+
+    def pick(self, key: str) -> Optional[CoreConnection]:
+        ranked = self.rank(key)
+        if self._healthy(ranked[0]):
+            return ranked[0]
+        for conn in self.standbys:
+            if self._healthy(conn):
+                return conn
+        for conn in ranked[1:]:
+            if self._healthy(conn):
+                return conn
+        # 刚建立的连接尚未稳定, 但总好过没有
+        for conn in ranked + self.standbys:
+            if conn.is_connect:
+                return conn
+        return None
+
+    async def wait_ready(self):
+        if self.is_connect:
+            return
+        waiters = [asyncio.create_task(c.ready.wait()) for c in self.connections]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for w in waiters:
+                w.cancel()
+
+    @property
+    def binary(self) -> bool:
+        '''当前所有在线连接都协商了msgpack时, 附件可直接以原始字节构建'''
+        online = [c for c in self.connections if c.is_connect]
+        return bool(online) and all(c.binary for c in online)
+
+    async def send(self, key: str, msg: MessageReceive):
+        # 发送失败会立即将该分片标记为断线, 随后重新选择分片
+        while True:
+            conn = self.pick(key)
+            if conn is None:
+                await self.wait_ready()
+                continue
+            if await conn.try_send(msg):
+                return
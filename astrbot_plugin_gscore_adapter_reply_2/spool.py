@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple, Union
+
+from astrbot.api import logger
+
+# 4的倍数, 每块base64可独立解码
+CHUNK_CHARS = 4 * 64 * 1024
+
+
+_IMAGE_MAGIC = (
+    (b'\x89PNG', '.png'),
+    (b'\xff\xd8', '.jpg'),
+    (b'GIF8', '.gif'),
+    (b'RIFF', '.webp'),
+    (b'BM', '.bmp'),
+)
+
+
+def _iter_base64(data: str, start: int = 0) -> Iterator[bytes]:
+    # 允许夹杂换行等空白: 去除后只解码完整的4字符组, 余下的并入下一块
+    rest = ''
+    for i in range(start, len(data), CHUNK_CHARS):
+        chunk = rest + ''.join(data[i : i + CHUNK_CHARS].split())
+        end = len(chunk) - len(chunk) % 4
+        rest = chunk[end:]
+        if end:
+            yield base64.b64decode(chunk[:end])
+    if rest:
+        # 不完整的结尾, 交给b64decode报错
+        yield base64.b64decode(rest)
+
+
+def base64_head(data: str, start: int = 0, size: int = 12) -> bytes:
+    '''解码开头的至少size个字节(数据足够时), 用于判断文件类型'''
+    chars = ''.join(data[start : start + size * 4].split())
+    return base64.b64decode(chars[: len(chars) - len(chars) % 4])
+
+
+def image_suffix(head: bytes) -> str:
+    for magic, suffix in _IMAGE_MAGIC:
+        if head.startswith(magic):
+            return suffix
+    return '.png'
+
+
+class FileSpool:
+    '''
+    [gsuid-core]发来文件/大图片的落盘目录
+
+    - 解码与写入在线程中分块进行, 不阻塞事件循环
+    - 以内容哈希命名, 相同文件只保存一份
+    - 后台清理超过TTL的文件, 并在超出磁盘配额时从最旧的文件开始删除
+    - 以`hold=True`写入的文件在`release`后立即删除, 持有期间不会被清理
+    '''
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        ttl: float = 3600,
+        quota_bytes: int = 512 * 1024 * 1024,
+        interval: float = 300,
+    ):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._refs: Dict[Path, int] = {}
+
+    def start(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._janitor())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def store_base64(
+        self,
+        file_name: str,
+        data: str,
+        start: int = 0,
+        hold: bool = False,
+    ) -> Path:
+        '''从data[start:]开始分块解码, 避免先切片复制一份完整的base64'''
+        tmp, digest = await asyncio.to_thread(
+            self._write, _iter_base64(data, start)
+        )
+        return self._commit(file_name, tmp, digest, hold)
+
+    async def store_bytes(
+        self,
+        file_name: str,
+        data: bytes,
+        hold: bool = False,
+    ) -> Path:
+        tmp, digest = await asyncio.to_thread(self._write, [data])
+        return self._commit(file_name, tmp, digest, hold)
+
+    def _hold(self, path: Path):
+        self._refs[path] = self._refs.get(path, 0) + 1
+
+    def _unhold(self, path: Path):
+        count = self._refs.get(path, 0) - 1
+        if count > 0:
+            self._refs[path] = count
+        else:
+            self._refs.pop(path, None)
+
+    def release(self, path: Path):
+        self._unhold(path)
+        if path in self._refs:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _write(self, chunks: Iterable[bytes]) -> Tuple[str, str]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        sha = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    sha.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return tmp, sha.hexdigest()
+
+    def _commit(self, file_name: str, tmp: str, digest: str, hold: bool) -> Path:
+        '''
+        在事件循环中同步完成持有与去重, 与`release`不会交错:
+        否则线程中判定文件已存在后, 同一文件的`release`可能先将其删除
+        '''
+        path = self.root / f'{digest[:32]}{Path(file_name).suffix}'
+        if hold:
+            self._hold(path)
+        try:
+            if path.exists():
+                # 已有相同内容的文件, 仅刷新其存活时间
+                os.utime(path)
+                os.remove(tmp)
+            else:
+                os.replace(tmp, path)
+        except BaseException:
+            if hold:
+                self._unhold(path)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return path
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                removed = await asyncio.to_thread(self.cleanup, set(self._refs))
+                if removed:
+                    logger.debug(f'[GsCore] 清理了{removed}个过期文件')
+            except Exception as e:
+                logger.warning(f'[GsCore] 清理文件目录失败: {e}')
+
+    def cleanup(self, held: Optional[Set[Path]] = None) -> int:
+        held = held or set()
+        if not self.root.exists():
+            return 0
+
+        now = time.time()
+        files = []
+        removed = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_file() or entry.name.endswith('.part'):
+                continue
+            if Path(entry.path) in held:
+                continue
+            st = entry.stat()
+            if self.ttl > 0 and now - st.st_mtime > self.ttl:
+                os.remove(entry.path)
+                removed += 1
+            else:
+                files.append((st.st_mtime, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        if self.quota_bytes > 0 and total > self.quota_bytes:
+            for _, size, path in sorted(files):
+                os.remove(path)
+                removed += 1
+                total -= size
+                if total <= self.quota_bytes:
+                    break
+        return removed
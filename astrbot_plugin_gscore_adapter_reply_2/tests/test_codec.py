@@ -0,0 +1,79 @@
+'''
+codec.decode的退路: 含未知类型消息段时逐段解码, 只跳过无法识别的部分
+'''
+
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip('astrbot')
+msgjson = pytest.importorskip('msgspec.json')
+msgpack = pytest.importorskip('msgspec.msgpack')
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+if str(PLUGIN_DIR.parent) not in sys.path:
+    sys.path.insert(0, str(PLUGIN_DIR.parent))
+
+codec = importlib.import_module(f'{PLUGIN_DIR.name}.codec')
+models = importlib.import_module(f'{PLUGIN_DIR.name}.models')
+
+
+def _payload(content):
+    return {
+        'bot_id': 'onebot',
+        'target_type': 'group',
+        'target_id': '1',
+        'content': content,
+    }
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_node_keeps_known_children(binary):
+    payload = _payload(
+        [
+            {'type': 'text', 'data': '抽卡记录'},
+            {
+                'type': 'node',
+                'data': [
+                    {'type': 'text', 'data': '第1抽'},
+                    {'type': 'unknown_widget', 'data': {'x': 1}},
+                ],
+            },
+        ]
+    )
+    data = msgpack.encode(payload) if binary else msgjson.encode(payload)
+
+    msg = codec.decode(data, binary)
+
+    assert [type(c) for c in msg.content] == [
+        models.TextSegment,
+        models.NodeSegment,
+    ]
+    node = msg.content[1]
+    assert [(c.type, c.data) for c in node.data] == [('text', '第1抽')]
+
+
+def test_unknown_top_level_segment_skipped():
+    payload = _payload(
+        [
+            {'type': 'unknown_widget', 'data': None},
+            {'type': 'text', 'data': 'ok'},
+        ]
+    )
+    msg = codec.decode(msgjson.encode(payload), False)
+    assert [(c.type, c.data) for c in msg.content] == [('text', 'ok')]
+
+
+@pytest.mark.parametrize('binary', [False, True])
+@pytest.mark.parametrize('tag', ['log_INFO', 'log_info', 'Log_Warning'])
+def test_log_tag_case_insensitive(binary, tag):
+    payload = _payload([{'type': tag, 'data': '插件已加载'}])
+    data = msgpack.encode(payload) if binary else msgjson.encode(payload)
+
+    (seg,) = codec.decode(data, binary).content
+
+    assert isinstance(seg, models.LogSegment)
+    assert seg.level == tag.split('_')[-1].lower()
+    assert seg.data == '插件已加载'